@@ -3,19 +3,19 @@ import logging
 from Anchor.visualizer import Visualizer
 
 logging.basicConfig(level=logging.INFO)
-from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
 from enum import Enum, auto
+from functools import partial
 from typing import Callable, Optional, Protocol, Tuple, Union
 
 import numpy as np
-from ConfigSpace import ConfigurationSpace
-from ConfigSpace.hyperparameters import UniformIntegerHyperparameter
-from skimage.segmentation import quickshift
-from smac.facade.smac_bb_facade import SMAC4BB
-from smac.scenario.scenario import Scenario
 
-from Anchor.bandit import KL_LUCB
+from Anchor.bandit import KL_LUCB, SuccessiveElimination
+from Anchor.cache import PredictionCache
 from Anchor.candidate import AnchorCandidate
+from Anchor.coverage import CoverageIndex
+from Anchor.executor import SamplingExecutor
 from Anchor.sampler import Sampler, Tasktype
 
 from .visualizer import Visualizer
@@ -36,9 +36,67 @@ class Anchor:
     visualizer: Visualizer = field(init=False)
     verbose: bool = False
     coverage_data: np.array = field(init=False)
+    coverage_index: CoverageIndex = field(init=False)
+    rng: np.random.Generator = field(init=False)
+    prediction_cache: Optional[PredictionCache] = field(init=False, default=None)
+    executor: Optional[SamplingExecutor] = field(init=False, default=None)
+    # candidates of the current explanation by their feature set
+    candidate_registry: dict = field(init=False, default_factory=dict)
 
     def __post_init__(self):
         logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.DEBUG)
+        # executor that was created from a name and is shut down by close
+        self.__own_executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Shuts down the executor the explainer created from a name (see
+        explain_instance and fit). Executor instances that were passed in
+        are left running. A fitted explainer keeps explaining without
+        the executor afterwards, which gives the same results.
+        """
+        if self.__own_executor is None:
+            return
+
+        self.__own_executor.shutdown()
+        if self.executor is self.__own_executor:
+            self.executor = None
+        if getattr(self, "sampler", None) is not None:
+            if self.sampler.executor is self.__own_executor:
+                self.sampler.executor = None
+        self.__own_executor = None
+
+    def __create_executor(
+        self, executor: Union[str, SamplingExecutor, None]
+    ) -> Optional[SamplingExecutor]:
+        """
+        Creates an executor given by name, the explainer owns it until
+        close is called. Executor instances are returned as they are.
+        """
+        if not isinstance(executor, str):
+            return executor
+
+        self.__own_executor = SamplingExecutor.create(executor)
+
+        return self.__own_executor
+
+    @property
+    def kl_lucb(self):
+        """
+        Bandit of the last explanation. Alias of bandit, which was named
+        kl_lucb before other bandits could be chosen.
+        """
+        return self.bandit
+
+    @kl_lucb.setter
+    def kl_lucb(self, bandit):
+        self.bandit = bandit
 
     def explain_instance(
         self,
@@ -47,12 +105,16 @@ class Anchor:
         method: str = "greedy",
         task_specific: dict = None,
         method_specific: dict = None,
+        bandit_specific: dict = None,
         num_coverage_samples: int = 10000,
         epsilon: float = 0.1,
         delta: float = 0.1,
         batch_size: int = 16,
+        cache_size: int = None,
         verbose=False,
         seed=69,
+        executor: Union[str, SamplingExecutor] = None,
+        bandit: str = "kl_lucb",
     ):
         """
         Main entrance point to explain an instance.
@@ -66,37 +128,253 @@ class Anchor:
             method_specific (dict): Optimization method specific arguments. For Beam Search this includes (``beam_size``) and (``desired_confidence``). 
                 For greedy this includes (``desired_confidence``). For Smac this includes (``run_time``) in seconds and (``optim``). 
                 Optim is a function with the signature AnchorCandiate -> float that will be minimized.
+            bandit_specific (dict): Additional arguments for the bandit. Both bandits support (``rounds_per_pull``)
+                to collect several rounds of samples for the pulled arms into one predict_fn call and (``solver``)
+                and (``tol``) for the confidence bound computation. Only (``kl_lucb``) supports (``prefetch``), the
+                number of pertubation batches that are generated in the background while predict_fn runs, its
+                counters are available via (``bandit.prefetch_stats``). Other arguments raise a ValueError.
             num_coverage_samples (int): Number of coverage samples
             desired_confidence (float): desired precision confidence for the anchor.
             epsilon (float)
             batch_size (int)
+            cache_size (int): When given, predictions of the pertubated samples are cached in a LRU cache
+                with at most cache_size entries, so that identical samples are only predicted once.
+                Hit and miss counters are available via (``prediction_cache``).
             verbose (bool)
+            seed (int): Seed of the random generator that is used for all samples of this explanation.
+            executor (Union[str, SamplingExecutor], optional): Generates the pertubations of the pulled arms
+                in parallel to the predict_fn calls: (``serial``), (``thread``), (``process``) or a
+                SamplingExecutor instance. An executor given by name is shut down after the explanation,
+                even if it fails.
+            bandit (str): Best arm identification of the search methods. (``kl_lucb``) pulls two arms per round,
+                (``elimination``) pulls all surviving arms per round and drops dominated arms
+                (see SuccessiveElimination), which needs less predict_fn calls for many candidates.
 
         Returns:
             exp (AnchorCandidate): The explanation of the original instance.
 
         """
         self.seed = seed
-        np.random.seed(seed)
+        self.rng = np.random.default_rng(seed)
 
         # in case args are empty
         if task_specific is None:
             task_specific = {}
 
+        self.prediction_cache = (
+            PredictionCache(cache_size) if cache_size is not None else None
+        )
+
+        # releases the executor of a previous fit, its sampler is replaced
+        self.close()
+        try:
+            self.executor = self.__create_executor(executor)
+            self.sampler = Sampler.create(
+                self.tasktype,
+                input,
+                predict_fn,
+                task_specific,
+                cache=self.prediction_cache,
+                rng=self.rng,
+                executor=self.executor,
+            )
+
+            return self.__explain(
+                method,
+                method_specific,
+                bandit_specific,
+                num_coverage_samples,
+                epsilon,
+                delta,
+                batch_size,
+                verbose,
+                bandit,
+            )
+        finally:
+            if isinstance(executor, str):
+                self.close()
+
+    def fit(
+        self,
+        predict_fn: Callable[[any], np.array],
+        task_specific: dict = None,
+        num_coverage_samples: int = 10000,
+        cache_size: int = None,
+        seed=69,
+        executor: Union[str, SamplingExecutor] = None,
+    ):
+        """
+        Prepares the explainer for explaining many instances of the same
+        task with explain. Everything that only depends on the dataset, the
+        model and the task settings is built once: the sampler with its
+        dataset (bins, value index), the coverage pool for tabular tasks,
+        the loaded bert model and its prediction caches for text tasks and
+        the image dataset for image tasks. The prediction cache is shared
+        by all instances as well.
+
+        Args:
+            predict_fn (Callable): A function that returns the class prediction for a sample.
+            task_specific (dict): Task specific arguments (see explain_instance).
+            num_coverage_samples (int): Number of coverage samples
+            cache_size (int): Size of the prediction cache (see explain_instance).
+            seed (int): Seed of the random generator.
+            executor (Union[str, SamplingExecutor], optional): Executor of the pertubations (see explain_instance).
+                It is kept for all following explanations. An executor given by name is shut down by close
+                (or when leaving the explainer as context manager).
+
+        Returns:
+            Anchor: self
+        """
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.num_coverage_samples = num_coverage_samples
+
+        self.prediction_cache = (
+            PredictionCache(cache_size) if cache_size is not None else None
+        )
+
+        self.close()
+        try:
+            self.executor = self.__create_executor(executor)
+            self.sampler = Sampler.create(
+                self.tasktype,
+                None,
+                predict_fn,
+                task_specific if task_specific is not None else {},
+                cache=self.prediction_cache,
+                rng=self.rng,
+                executor=self.executor,
+            )
+            self.sampler.fit_coverage(num_coverage_samples)
+        except BaseException:
+            self.close()
+            raise
+
+        return self
+
+    def explain(
+        self,
+        input: any,
+        method: str = "greedy",
+        method_specific: dict = None,
+        bandit_specific: dict = None,
+        epsilon: float = 0.1,
+        delta: float = 0.1,
+        batch_size: int = 16,
+        verbose=False,
+        seed: int = None,
+        bandit: str = "kl_lucb",
+    ):
+        """
+        Explains an instance with the explainer prepared by fit. Only the
+        instance specific parts of the sampler are computed.
+
+        Args:
+            input (Any): The instance to explain - can be an image, data row or text.
+            method (String): Defines the optimization function (see explain_instance).
+            method_specific (dict): Optimization method specific arguments (see explain_instance).
+            bandit_specific (dict): Additional arguments for the bandit (see explain_instance).
+            epsilon (float)
+            delta (float)
+            batch_size (int)
+            verbose (bool)
+            seed (int, optional): Reseeds the random generator for this explanation.
+            bandit (str): (``kl_lucb``) or (``elimination``) (see explain_instance).
+
+        Returns:
+            exp (AnchorCandidate): The explanation of the instance.
+        """
+        assert (
+            getattr(self, "sampler", None) is not None
+        ), "fit must be called before explain."
+
+        if seed is not None:
+            self.seed = seed
+            self.rng = self.sampler.rng = np.random.default_rng(seed)
+
+        self.sampler.set_input(input)
+
+        return self.__explain(
+            method,
+            method_specific,
+            bandit_specific,
+            self.num_coverage_samples,
+            epsilon,
+            delta,
+            batch_size,
+            verbose,
+            bandit,
+        )
+
+    def __explain(
+        self,
+        method: str,
+        method_specific: dict,
+        bandit_specific: dict,
+        num_coverage_samples: int,
+        epsilon: float,
+        delta: float,
+        batch_size: int,
+        verbose: bool,
+        bandit: str = "kl_lucb",
+    ) -> AnchorCandidate:
+        """
+        Searches the anchor of the instance the sampler is set to.
+
+        Returns:
+            exp (AnchorCandidate): The explanation of the instance.
+        """
+        # in case args are empty
         if method_specific is None:
             method_specific = {}
 
-        self.kl_lucb = KL_LUCB(
-            eps=epsilon, delta=delta, batch_size=batch_size, verbose=verbose
+        if bandit_specific is None:
+            bandit_specific = {}
+
+        if bandit == "kl_lucb":
+            bandit_cls = KL_LUCB
+        elif bandit == "elimination":
+            bandit_cls = SuccessiveElimination
+        else:
+            raise ValueError("Unknown bandit {}".format(bandit))
+
+        # eps, delta, batch_size and verbose are set by the explain arguments
+        explain_args = ("eps", "delta", "batch_size", "verbose", "prefetch_stats")
+        supported = [
+            f.name for f in fields(bandit_cls) if f.init and f.name not in explain_args
+        ]
+        unsupported = sorted(set(bandit_specific) - set(supported))
+        if len(unsupported) > 0:
+            raise ValueError(
+                "Unsupported bandit_specific for {}: {}, supported are: {}".format(
+                    bandit, ", ".join(unsupported), ", ".join(supported)
+                )
+            )
+
+        self.bandit = bandit_cls(
+            eps=epsilon,
+            delta=delta,
+            batch_size=batch_size,
+            verbose=verbose,
+            **bandit_specific,
         )
-        self.sampler = Sampler.create(self.tasktype, input, predict_fn, task_specific)
 
         self.batch_size = batch_size
         self.delta = delta
+        self.candidate_registry = {}
+
+        # executors without shared memory copy the state of the sampler per instance
+        if self.sampler.executor is not None:
+            self.sampler.executor.bind(self.sampler)
+
         logging.info(" Start Sampling")
-        _, self.coverage_data = self.sampler.sample(
-            AnchorCandidate(feature_mask=[]), num_coverage_samples, False
-        )
+        self.coverage_data = self.sampler.coverage_masks(num_coverage_samples)
+        if self.sampler.packed_masks:
+            self.coverage_index = CoverageIndex.from_packed(
+                self.coverage_data, self.sampler.num_features
+            )
+        else:
+            self.coverage_index = CoverageIndex(self.coverage_data)
         exp = AnchorCandidate(feature_mask=[])
         if method == "greedy":
             logging.info(" Start Greedy Search")
@@ -111,6 +389,69 @@ class Anchor:
 
         return exp
 
+    def explain_many(
+        self,
+        inputs: list,
+        predict_fn: Callable[[any], np.array],
+        backend: str = "thread",
+        n_jobs: int = None,
+        seed: int = 69,
+        chunksize: int = 1,
+        **kwargs,
+    ) -> list[AnchorCandidate]:
+        """
+        Explains a batch of instances in a thread or process pool.
+
+        Every instance is explained by its own Anchor object with its own
+        random generator derived from seed, so the workers share no mutable
+        state and the results do not depend on the backend or the number of
+        workers. With the thread backend all workers call the same predict_fn,
+        which allows it to batch requests of different workers: wrap it in a
+        MicroBatchPredictor (see Anchor.batching) to run the small sample
+        batches of all workers through the model in larger batches. The
+        process backend requires a picklable predict_fn and sends it (and the
+        task specific arguments) only once to every worker.
+
+        Args:
+            inputs (list): Instances to explain. For tabular tasks a 2d array of rows can be given.
+            predict_fn (Callable): A function that returns the class prediction for a sample.
+            backend (str): (``thread``) or (``process``).
+            n_jobs (int): Number of workers. Defaults to the executors default.
+            seed (int): Seed from which the per instance seeds are derived.
+            chunksize (int): Number of instances that are send to a process at once.
+            **kwargs: Further arguments of explain_instance (e.g. method, task_specific, ...).
+
+        Returns:
+            list[AnchorCandidate]: Explanation per instance in the order of inputs.
+        """
+        if self.tasktype == Tasktype.TABULAR:
+            inputs = [np.asarray(x).reshape(1, -1) for x in inputs]
+
+        seeds = [
+            int(s.generate_state(1)[0])
+            for s in np.random.SeedSequence(seed).spawn(len(inputs))
+        ]
+
+        if backend == "thread":
+            explain = partial(
+                _explain_task, self.tasktype, self.verbose, predict_fn, kwargs
+            )
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                return list(executor.map(explain, inputs, seeds))
+        elif backend == "process":
+            with ProcessPoolExecutor(
+                max_workers=n_jobs,
+                initializer=_init_worker,
+                initargs=(self.tasktype, self.verbose, predict_fn, kwargs),
+            ) as executor:
+                return list(
+                    executor.map(
+                        _explain_worker_task, inputs, seeds, chunksize=chunksize
+                    )
+                )
+        else:
+            raise ValueError("Unknown backend {}".format(backend))
+
     def visualize(self, anchor: AnchorCandidate, instance: np.ndarray):
         """
         Visualized the instance given the anchor.
@@ -126,14 +467,23 @@ class Anchor:
         except AttributeError:
             features = None
 
-        return Visualizer.create(self.tasktype).visualize(anchor, instance, features)
+        kwargs = {}
+        if self.tasktype == Tasktype.TABULAR:
+            kwargs["discretizer"] = self.sampler.discretizer
+
+        return Visualizer.create(self.tasktype, **kwargs).visualize(
+            anchor, instance, features
+        )
 
     def generate_candidates(
         self, prev_anchors: list[AnchorCandidate], coverage_min: float
     ) -> list[AnchorCandidate]:
         """
         Generates new anchor candidates by adding a new unseen feature
-        to each previous anchor feature mask.
+        to each previous anchor feature mask. A feature set is generated
+        only once, candidates that were generated before (e.g. [0, 2]
+        after [2, 0]) are taken from the candidate registry with their
+        samples, so the bandit starts with their bounds.
 
         Args:
             prev_anchors (list[AnchorCandidate]): previous anchors.
@@ -143,11 +493,16 @@ class Anchor:
             list[AnchorCandidate]: new anchor candidates
         """
         new_candidates: list[AnchorCandidate] = []
+        generated: set[frozenset] = set()
+        extended_candidates: list[AnchorCandidate] = []
+        parent_bits: list[np.ndarray] = []
+        added_features: list[int] = []
         # iterate over possible features or predicates
         for feature in range(self.sampler.num_features):
             # check if we have no prev anchors and create a complete new set
             if len(prev_anchors) == 0:
-                nc = AnchorCandidate(feature_mask=[feature])
+                nc = self.__get_candidate([feature])
+                nc.coverage_bits = self.coverage_index.covered([feature])
                 new_candidates.append(nc)
 
             for anchor in prev_anchors:
@@ -155,17 +510,60 @@ class Anchor:
                 if feature in anchor.feature_mask:
                     continue
 
+                if anchor.coverage_bits is None:
+                    anchor.coverage_bits = self.coverage_index.covered(
+                        anchor.feature_mask
+                    )
+
                 # append new feature to candidate
                 tmp = anchor.feature_mask.copy()
                 tmp.append(feature)
 
-                nc = AnchorCandidate(feature_mask=tmp)
-                nc.coverage = self.__calculate_coverage(nc)
-                if nc.coverage >= coverage_min:
-                    new_candidates.append(nc)
+                # the same feature set can be reached from several anchors
+                if frozenset(tmp) in generated:
+                    continue
+                generated.add(frozenset(tmp))
+
+                extended_candidates.append(self.__get_candidate(tmp))
+                parent_bits.append(anchor.coverage_bits)
+                added_features.append(feature)
+
+        if len(extended_candidates) == 0:
+            return new_candidates
+
+        # the covered set of a child is the covered set of its parent
+        # intersected with the column of the added feature
+        child_bits = self.coverage_index.extend(np.stack(parent_bits), added_features)
+        coverages = (
+            self.coverage_index.count(child_bits) / self.coverage_index.num_samples
+        )
+        for nc, bits, coverage in zip(extended_candidates, child_bits, coverages):
+            nc.coverage = float(coverage)
+            if nc.coverage >= coverage_min:
+                nc.coverage_bits = bits
+                new_candidates.append(nc)
 
         return new_candidates
 
+    def __get_candidate(self, feature_mask: list) -> AnchorCandidate:
+        """
+        Returns the registered candidate of the feature set or registers
+        a new one. The key is the unordered feature set, so the statistics
+        of a candidate are kept regardless of the order its features were
+        added in.
+
+        Args:
+            feature_mask (list): Features of the candidate.
+
+        Returns:
+            AnchorCandidate: Candidate with the samples collected so far.
+        """
+        key = frozenset(feature_mask)
+        if key not in self.candidate_registry:
+            self.candidate_registry[key] = AnchorCandidate(feature_mask=feature_mask)
+
+        return self.candidate_registry[key]
+
     def __calculate_coverage(self, anchor: AnchorCandidate) -> float:
         """
         Calculates the coverage for an given anchor.
@@ -176,13 +574,7 @@ class Anchor:
         Returns:
             float: Coverage
         """
-        included_samples = 0
-        for mask in self.coverage_data:  # replace with numpy only
-            # check if mask positive samples are included in the feature_mask of the anchor
-            if np.all(np.isin(anchor.feature_mask, np.where(mask == 1)), axis=0):
-                included_samples += 1
-
-        return included_samples / self.coverage_data.shape[0]
+        return self.coverage_index.coverage(anchor.feature_mask)
 
     def __check_valid_candidate(
         self,
@@ -227,7 +619,7 @@ class Anchor:
             AnchorCandidate: best found anchor
         """
         candidates = self.generate_candidates([], min_coverage)
-        anchor = self.kl_lucb.get_best_candidates(candidates, self.sampler, 1)[0]
+        anchor = self.bandit.get_best_candidates(candidates, self.sampler, 1)[0]
 
         while not self.__check_valid_candidate(
             anchor, 1, self.batch_size, desired_confidence, self.delta
@@ -238,7 +630,7 @@ class Anchor:
             if len(candidates) == 0:
                 break
 
-            anchor = self.kl_lucb.get_best_candidates(candidates, self.sampler, 1)[0]
+            anchor = self.bandit.get_best_candidates(candidates, self.sampler, 1)[0]
 
         return anchor
 
@@ -270,7 +662,7 @@ class Anchor:
             if len(candidates) == 0:
                 break
 
-            best_candidates = self.kl_lucb.get_best_candidates(
+            best_candidates = self.bandit.get_best_candidates(
                 candidates, self.sampler, min(beam_size, len(candidates))
             )
 
@@ -310,6 +702,12 @@ class Anchor:
         self.smac_optim_func = optim if optim is not None else None
 
         # create config space
+        # smac is only needed (and imported) for this search method
+        from ConfigSpace import ConfigurationSpace
+        from ConfigSpace.hyperparameters import UniformIntegerHyperparameter
+        from smac.facade.smac_bb_facade import SMAC4BB
+        from smac.scenario.scenario import Scenario
+
         configspace = ConfigurationSpace()
 
         # mask the possible features
@@ -375,3 +773,42 @@ class Anchor:
                 info,
             )
 
+
+def _explain_task(
+    tasktype: Tasktype,
+    verbose: bool,
+    predict_fn: Callable[[any], np.array],
+    kwargs: dict,
+    input: any,
+    seed: int,
+) -> AnchorCandidate:
+    """
+    Explains a single instance with a fresh Anchor object (used by explain_many).
+    """
+    return Anchor(tasktype, verbose=verbose).explain_instance(
+        input, predict_fn, seed=seed, **kwargs
+    )
+
+
+# arguments that are shared by all tasks of a process worker
+_worker_args = None
+
+
+def _init_worker(
+    tasktype: Tasktype,
+    verbose: bool,
+    predict_fn: Callable[[any], np.array],
+    kwargs: dict,
+):
+    """
+    Stores the shared arguments once per process worker (used by explain_many).
+    """
+    global _worker_args
+    _worker_args = (tasktype, verbose, predict_fn, kwargs)
+
+
+def _explain_worker_task(input: any, seed: int) -> AnchorCandidate:
+    """
+    Explains a single instance within a process worker (used by explain_many).
+    """
+    return _explain_task(*_worker_args, input, seed)
@@ -1,13 +1,27 @@
 import logging
+from collections import deque
 from dataclasses import dataclass, field
 from typing import Callable, Tuple
 
 import numpy as np
 
 from .candidate import AnchorCandidate
+from .executor import SamplingExecutor
 from .sampler import Sampler
 
 
+@dataclass()
+class PrefetchStats:
+    """
+    Counters of the speculative pertubation batches of KL_LUCB (see KL_LUCB.prefetch).
+    """
+
+    produced: int = 0  # speculative batches that were started
+    used: int = 0  # speculative batches that were consumed by a pull
+    discarded: int = 0  # speculative batches of arms that were not pulled
+    missed: int = 0  # batches that were generated on demand
+
+
 @dataclass(frozen=True)
 class KL_LUCB:
     """
@@ -23,6 +37,17 @@ class KL_LUCB:
     delta: float = 0.1
     batch_size: int = 10
     verbose: bool = False
+    # number of rounds of samples an arm gets per pull, all pulled
+    # arms of an iteration share a single predict_fn call
+    rounds_per_pull: int = 1
+    # solver for the KL confidence bounds, (``bisection``) or (``newton``)
+    solver: str = "bisection"
+    # stopping tolerance of the newton solver
+    tol: float = 1e-10
+    # number of pertubation batches that are generated speculatively for the arms
+    # that are expected to be pulled next, while predict_fn runs. 0 disables it.
+    prefetch: int = 0
+    prefetch_stats: PrefetchStats = field(default_factory=PrefetchStats, compare=False)
 
     def get_best_candidates(
         self,
@@ -52,15 +77,44 @@ class KL_LUCB:
             candidates, prec_lb, prec_ub, t, top_n
         )
         prec_diff = prec_ub[ut] - prec_lb[lt]
-        while prec_diff > self.eps:
-            candidates[ut], _ = sampler.sample(candidates[ut], self.batch_size)
-            candidates[lt], _ = sampler.sample(candidates[lt], self.batch_size)
 
-            t += 1
-            lt, ut, prec_lb, prec_ub = self.__update_bounds(
-                candidates, prec_lb, prec_ub, t, top_n
+        prefetch_queue = None
+        if self.prefetch > 0 and prec_diff > self.eps:
+            prefetch_queue = _PrefetchQueue(
+                sampler,
+                candidates,
+                self.batch_size * self.rounds_per_pull,
+                self.prefetch,
+                self.prefetch_stats,
             )
-            prec_diff = prec_ub[ut] - prec_lb[lt]
+
+        # the queued batches are discarded even if a pull raises
+        try:
+            if prefetch_queue is not None:
+                prefetch_queue.speculate([ut, lt])
+
+            while prec_diff > self.eps:
+                # pull ut and lt with one predict_fn call
+                if prefetch_queue is None:
+                    sampler.sample_batch(
+                        [candidates[ut], candidates[lt]],
+                        self.batch_size * self.rounds_per_pull,
+                    )
+                else:
+                    prefetch_queue.pull([ut, lt])
+
+                # every round counts for the confidence bound
+                t += self.rounds_per_pull
+                lt, ut, prec_lb, prec_ub = self.__update_bounds(
+                    candidates, prec_lb, prec_ub, t, top_n
+                )
+                prec_diff = prec_ub[ut] - prec_lb[lt]
+
+                if prefetch_queue is not None and prec_diff > self.eps:
+                    prefetch_queue.speculate([ut, lt])
+        finally:
+            if prefetch_queue is not None:
+                prefetch_queue.close()
 
         best_candidates_idxs = np.argsort([c.precision for c in candidates])[
             -top_n:
@@ -90,7 +144,10 @@ class KL_LUCB:
             ut (int)
         """
 
-        means = [c.precision for c in candidates]  # mean precision per candidate
+        means = np.array(
+            [c.precision for c in candidates]
+        )  # mean precision per candidate
+        n_samples = np.array([max(c.n_samples, 1) for c in candidates])
         sorted_means = np.argsort(means)
 
         beta = KL_LUCB.compute_beta(len(candidates), t, self.delta)
@@ -99,14 +156,12 @@ class KL_LUCB:
             sorted_means[:-top_n],
         )  # divide list into the top_n best candidates and the rest
 
-        for f in j:
-            lb[f] = KL_LUCB.dlow_bernoulli(
-                means[f], beta / max(candidates[f].n_samples, 1)
-            )
-        for f in nj:
-            ub[f] = KL_LUCB.dup_bernoulli(
-                means[f], beta / max(candidates[f].n_samples, 1)
-            )
+        lb[j] = KL_LUCB.dlow_bernoulli_batch(
+            means[j], beta / n_samples[j], self.solver, self.tol
+        )
+        ub[nj] = KL_LUCB.dup_bernoulli_batch(
+            means[nj], beta / n_samples[nj], self.solver, self.tol
+        )
 
         ut = nj[np.argmax(ub[nj])] if len(nj) != 0 else 0
         # candidate where upper bound of candidate is maximal
@@ -157,3 +212,349 @@ class KL_LUCB:
         q = min(0.9999999999999999, max(0.0000001, q))
 
         return p * np.log(float(p) / q) + (1 - p) * np.log(float(1 - p) / (1 - q))
+
+    # Array versions of the bounds above which compute the bounds for all arms at once
+
+    @staticmethod
+    def dup_bernoulli_batch(
+        precisions: np.ndarray,
+        levels: np.ndarray,
+        solver: str = "bisection",
+        tol: float = 1e-10,
+    ) -> np.ndarray:
+        """
+        Upper confidence bound for every arm, i.e. the largest q with
+        kl(precision, q) <= level.
+
+        Args:
+            precisions (np.ndarray): Mean precision per arm.
+            levels (np.ndarray): Exploration level per arm (beta / n_samples).
+            solver (str): (``bisection``) gives the same result as dup_bernoulli, (``newton``)
+                runs a newton iteration until the step is smaller than tol.
+            tol (float): Stopping tolerance of the newton solver.
+
+        Returns:
+            np.ndarray: Upper bound per arm.
+        """
+        precisions, levels = np.broadcast_arrays(
+            np.asarray(precisions, dtype=float), np.asarray(levels, dtype=float)
+        )
+        lm = precisions.copy()
+        um = np.minimum(np.minimum(1, precisions + np.sqrt(levels / 2.0)), 1)
+
+        if solver == "newton":
+            return KL_LUCB.__newton_bound(precisions, levels, um, True, tol)
+        elif solver != "bisection":
+            raise ValueError("Unknown solver {}".format(solver))
+
+        for _ in range(25):
+            qm = (um + lm) / 2.0
+            above = KL_LUCB.kl_bernoulli_batch(precisions, qm) > levels
+            um = np.where(above, qm, um)
+            lm = np.where(above, lm, qm)
+        return um
+
+    @staticmethod
+    def dlow_bernoulli_batch(
+        precisions: np.ndarray,
+        levels: np.ndarray,
+        solver: str = "bisection",
+        tol: float = 1e-10,
+    ) -> np.ndarray:
+        """
+        Lower confidence bound for every arm, i.e. the smallest q with
+        kl(precision, q) <= level.
+
+        Args:
+            precisions (np.ndarray): Mean precision per arm.
+            levels (np.ndarray): Exploration level per arm (beta / n_samples).
+            solver (str): (``bisection``) gives the same result as dlow_bernoulli, (``newton``)
+                runs a newton iteration until the step is smaller than tol.
+            tol (float): Stopping tolerance of the newton solver.
+
+        Returns:
+            np.ndarray: Lower bound per arm.
+        """
+        precisions, levels = np.broadcast_arrays(
+            np.asarray(precisions, dtype=float), np.asarray(levels, dtype=float)
+        )
+        um = precisions.copy()
+        lm = np.maximum(np.minimum(1, precisions - np.sqrt(levels / 2.0)), 0)
+
+        if solver == "newton":
+            return KL_LUCB.__newton_bound(precisions, levels, lm, False, tol)
+        elif solver != "bisection":
+            raise ValueError("Unknown solver {}".format(solver))
+
+        for _ in range(25):
+            qm = (um + lm) / 2.0
+            above = KL_LUCB.kl_bernoulli_batch(precisions, qm) > levels
+            lm = np.where(above, qm, lm)
+            um = np.where(above, um, qm)
+        return lm
+
+    @staticmethod
+    def __newton_bound(
+        precisions: np.ndarray,
+        levels: np.ndarray,
+        start: np.ndarray,
+        upper: bool,
+        tol: float,
+        max_iter: int = 50,
+    ) -> np.ndarray:
+        """
+        Solves kl(precision, q) = level with newton steps on u = -log(1 - q)
+        for the upper and u = -log(q) for the lower bound. In u the kl divergence
+        is convex and increasing and the hoeffding bound (start) lies right of the
+        root since kl(p, q) >= 2 (p - q)^2, so the iteration converges monotonically.
+        """
+        # bounds already at the border of [0, 1] are kept
+        done = start == precisions
+        clipped = np.clip(start, 0.0000001, 0.9999999999999999)
+        u = -np.log(1 - clipped) if upper else -np.log(clipped)
+
+        q = clipped
+        for _ in range(max_iter):
+            q = -np.expm1(-u) if upper else np.exp(-u)
+            f = KL_LUCB.kl_bernoulli_batch(precisions, q) - levels
+            df = (q - precisions) / q if upper else (precisions - q) / (1 - q)
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                step = np.where(done | (df <= 0), 0, f / df)
+            u = u - step
+
+            q_new = -np.expm1(-u) if upper else np.exp(-u)
+            if np.all(np.abs(q_new - q) < tol):
+                q = q_new
+                break
+            q = q_new
+
+        # the bound can not lie on the other side of the precision
+        q = np.maximum(q, precisions) if upper else np.minimum(q, precisions)
+        return np.where(done, start, q)
+
+    @staticmethod
+    def kl_bernoulli_batch(precisions: np.ndarray, qs: np.ndarray) -> np.ndarray:
+        p = np.clip(precisions, 0.0000001, 0.9999999999999999)
+        q = np.clip(qs, 0.0000001, 0.9999999999999999)
+
+        return p * np.log(p / q) + (1 - p) * np.log((1 - p) / (1 - q))
+
+
+class _PrefetchQueue:
+    """
+    Bounded queue of pertubation batches that are generated in the
+    background for the arms KL_LUCB is expected to pull next. Since KL_LUCB
+    mostly pulls the same two arms over several iterations, the arms of
+    the last pull are speculated to be pulled again. Pertubations do not
+    depend on the labels, so a prefetched batch is used like a batch that
+    is generated on demand.
+
+    The batches are generated by the executor of the sampler or by a
+    single background thread. Every batch draws from its own generator,
+    spawned in the order of the bandit's decisions, so the result only
+    depends on the seed and the prefetch depth.
+    """
+
+    def __init__(
+        self,
+        sampler: Sampler,
+        candidates: list[AnchorCandidate],
+        num_samples: int,
+        size: int,
+        stats: PrefetchStats,
+    ):
+        """
+        Args:
+            sampler (Sampler): Sampler of the arms.
+            candidates (list[AnchorCandidate]): Arms of the bandit.
+            num_samples (int): Number of samples per batch.
+            size (int): Maximal number of queued batches.
+            stats (PrefetchStats): Counters that are updated.
+        """
+        self.sampler = sampler
+        self.candidates = candidates
+        self.num_samples = num_samples
+        self.size = size
+        self.stats = stats
+
+        self.__own_executor = None
+        self.executor = sampler.executor
+        if self.executor is None:
+            self.executor = self.__own_executor = SamplingExecutor.create(
+                "thread", n_jobs=1
+            )
+
+        self.__queue = deque()  # (arm, future) in order of submission
+
+    def pull(self, arms: list[int]):
+        """
+        Predicts one batch per arm with a single predict_fn call. Queued
+        batches are used if available. Before predicting, the queue is
+        refilled for the same arms so the workers keep generating while
+        predict_fn runs.
+
+        Args:
+            arms (list[int]): Indices of the pulled arms.
+        """
+        futures = []
+        for arm in arms:
+            future = self.__take(arm)
+            if future is None:
+                self.stats.missed += 1
+                future = self.__submit(arm)
+            else:
+                self.stats.used += 1
+            futures.append(future)
+
+        self.speculate(arms)
+
+        pertubations = [future.result() for future in futures]
+        self.sampler.label_batch(
+            [self.candidates[arm] for arm in arms],
+            np.concatenate([samples for samples, _ in pertubations], axis=0),
+            np.concatenate([masks for _, masks in pertubations], axis=0),
+            self.num_samples,
+        )
+
+    def speculate(self, arms: list[int]):
+        """
+        Discards the queued batches of arms that are not expected anymore
+        and fills the queue with batches for the expected arms.
+
+        Args:
+            arms (list[int]): Indices of the arms that are expected to be pulled next.
+        """
+        kept = deque()
+        for arm, future in self.__queue:
+            if arm in arms:
+                kept.append((arm, future))
+            else:
+                future.cancel()
+                self.stats.discarded += 1
+        self.__queue = kept
+
+        # one batch per expected arm and pull, the arm with the least batches first
+        while len(arms) > 0 and len(self.__queue) < self.size:
+            queued = [sum(a == arm for a, _ in self.__queue) for arm in arms]
+            arm = arms[int(np.argmin(queued))]
+            self.__queue.append((arm, self.__submit(arm)))
+            self.stats.produced += 1
+
+    def close(self):
+        """
+        Discards the remaining batches.
+        """
+        self.speculate([])
+        if self.__own_executor is not None:
+            self.__own_executor.shutdown()
+
+    def __take(self, arm: int):
+        """
+        Removes the oldest queued batch of the arm.
+
+        Returns:
+            Future: Future of the batch or None if no batch of the arm is queued.
+        """
+        for i, (queued_arm, future) in enumerate(self.__queue):
+            if queued_arm == arm:
+                del self.__queue[i]
+                return future
+
+        return None
+
+    def __submit(self, arm: int):
+        """
+        Starts generating a batch of the arm with its own generator.
+        """
+        (rng,) = self.sampler.rng.spawn(1)
+        return self.executor.submit(
+            self.sampler, self.candidates[arm], self.num_samples, rng
+        )
+
+
+@dataclass(frozen=True)
+class SuccessiveElimination:
+    """
+    Batched best arm identification by successive elimination. Every
+    round pulls all surviving arms with one predict_fn call and drops the
+    arms whose upper bound is below the top_n-th highest lower bound, as
+    they can not be among the best arms anymore. Uses the KL confidence
+    bounds of KL_LUCB and stops with the same criterion.
+
+    Needs far less rounds and predict_fn calls than KL_LUCB, which pulls
+    two arms per round, when there are many arms (e.g. the beam search on
+    wide tables), but spends samples on every arm in the first rounds.
+
+    More information can be found in the following paper:
+    https://www.jmlr.org/papers/volume7/evendar06a/evendar06a.pdf
+    """
+
+    eps: float = 0.1
+    delta: float = 0.1
+    batch_size: int = 10
+    verbose: bool = False
+    # number of rounds of samples an arm gets per pull
+    rounds_per_pull: int = 1
+    # solver for the KL confidence bounds, (``bisection``) or (``newton``)
+    solver: str = "bisection"
+    # stopping tolerance of the newton solver
+    tol: float = 1e-10
+
+    def get_best_candidates(
+        self,
+        candidates: list[AnchorCandidate],
+        sampler: Sampler,
+        top_n: int = 1,
+    ) -> list[AnchorCandidate]:
+        """
+        Find top-n anchor candidates with highest expected precision.
+
+        Args:
+            candidates (list[AnchorCandidate])
+            sampler (Sampler)
+            top_n (int)
+        Returns:
+            best_candidates (list[AnchorCandidate])
+        """
+        assert len(candidates) > 0, "No candidates"
+        assert top_n > 0, "top_n must be higher than 0"
+
+        t = 0
+        active = np.arange(len(candidates))  # surviving arms
+        while True:
+            # pull all surviving arms with one predict_fn call
+            sampler.sample_batch(
+                [candidates[i] for i in active],
+                self.batch_size * self.rounds_per_pull,
+            )
+            t += self.rounds_per_pull
+
+            means = np.array([candidates[i].precision for i in active])
+            n_samples = np.array([max(candidates[i].n_samples, 1) for i in active])
+            beta = KL_LUCB.compute_beta(len(candidates), t, self.delta)
+            lb = KL_LUCB.dlow_bernoulli_batch(
+                means, beta / n_samples, self.solver, self.tol
+            )
+            ub = KL_LUCB.dup_bernoulli_batch(
+                means, beta / n_samples, self.solver, self.tol
+            )
+
+            # at least top_n arms have a lower bound above the upper bound of a dominated arm
+            survivors = ub >= np.sort(lb)[-top_n]
+            active, means, lb, ub = (
+                active[survivors],
+                means[survivors],
+                lb[survivors],
+                ub[survivors],
+            )
+
+            sorted_means = np.argsort(means)
+            j, nj = sorted_means[-top_n:], sorted_means[:-top_n]
+            if len(nj) == 0 or ub[nj].max() - lb[j].min() <= self.eps:
+                break
+
+            if self.verbose:
+                logging.info(" Round {}: {} arms left".format(t, len(active)))
+
+        return [candidates[active[idx]] for idx in j]
@@ -0,0 +1,179 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+import numpy as np
+
+
+class MicroBatchPredictor:
+    """
+    Predict function adapter that coalesces the calls of concurrent
+    explanations into larger batches.
+
+    Every call is queued. A background thread takes the queued calls
+    until max_batch_size rows are collected or max_delay seconds passed
+    since the first one arrived, runs them through predict_fn at once and
+    returns every caller its part of the predictions. Calls with more
+    than max_batch_size rows are predicted on their own.
+
+    The adapter is used like the predict_fn it wraps, e.g. by several
+    threads (see Anchor.explain_many with the thread backend) or by
+    asyncio tasks via predict_async.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[any], np.ndarray],
+        max_batch_size: int = 1024,
+        max_delay: float = 0.005,
+    ):
+        """
+        Args:
+            predict_fn (Callable[[any], np.ndarray]): Black box model predict function. Gets numpy arrays
+                (tabular, image) or lists (text) like the samplers pass them.
+            max_batch_size (int): Maximal number of rows per predict_fn call.
+            max_delay (float): Maximal time in seconds a call waits for other calls.
+        """
+        assert max_batch_size > 0, "max_batch_size must be higher than 0"
+
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+
+        # number of predict_fn calls and of coalesced calls
+        self.num_batches = 0
+        self.num_requests = 0
+
+        self.__requests = []  # queued (samples, future)
+        self.__condition = threading.Condition()
+        self.__closed = False
+        self.__worker = threading.Thread(target=self.__run, daemon=True)
+        self.__worker.start()
+
+    def __call__(self, samples: any) -> np.ndarray:
+        """
+        Predicts the samples together with the samples of concurrent calls.
+
+        Args:
+            samples (any): Samples as passed by the sampler.
+
+        Returns:
+            np.ndarray: Predictions of the samples.
+        """
+        return self.submit(samples).result()
+
+    async def predict_async(self, samples: any) -> np.ndarray:
+        """
+        Predicts the samples without blocking the event loop.
+
+        Args:
+            samples (any): Samples as passed by the sampler.
+
+        Returns:
+            np.ndarray: Predictions of the samples.
+        """
+        return await asyncio.wrap_future(self.submit(samples))
+
+    def submit(self, samples: any) -> Future:
+        """
+        Queues the samples.
+
+        Args:
+            samples (any): Samples as passed by the sampler.
+
+        Returns:
+            Future: Future of the predictions.
+        """
+        future = Future()
+        with self.__condition:
+            assert not self.__closed, "MicroBatchPredictor is closed."
+            self.__requests.append((samples, future))
+            self.__condition.notify()
+
+        return future
+
+    def close(self):
+        """
+        Predicts the queued calls and stops the background thread.
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify()
+        self.__worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __run(self):
+        """
+        Background loop that collects and predicts the batches.
+        """
+        while True:
+            with self.__condition:
+                while len(self.__requests) == 0 and not self.__closed:
+                    self.__condition.wait()
+                if len(self.__requests) == 0:
+                    return
+
+                # wait for further calls until the batch is full or the deadline passed
+                deadline = time.monotonic() + self.max_delay
+                while not self.__closed:
+                    num_rows = sum(len(samples) for samples, _ in self.__requests)
+                    remaining = deadline - time.monotonic()
+                    if num_rows >= self.max_batch_size or remaining <= 0:
+                        break
+                    self.__condition.wait(remaining)
+
+                batch = self.__take_batch()
+
+            self.__predict(batch)
+
+    def __take_batch(self) -> list:
+        """
+        Removes the calls of the next batch from the queue. Takes at least
+        one call and further calls as long as max_batch_size is not exceeded.
+
+        Returns:
+            list: (samples, future) per call
+        """
+        batch = [self.__requests[0]]
+        num_rows = len(batch[0][0])
+        for samples, future in self.__requests[1:]:
+            if num_rows + len(samples) > self.max_batch_size:
+                break
+            batch.append((samples, future))
+            num_rows += len(samples)
+
+        del self.__requests[: len(batch)]
+        return batch
+
+    def __predict(self, batch: list):
+        """
+        Runs one predict_fn call for the batch and resolves its futures.
+
+        Args:
+            batch (list): (samples, future) per call
+        """
+        samples = [samples for samples, _ in batch]
+        sizes = [len(s) for s in samples]
+        if all(isinstance(s, np.ndarray) for s in samples):
+            samples = np.concatenate(samples, axis=0)
+        else:
+            samples = [sample for s in samples for sample in s]
+
+        try:
+            preds = np.asarray(self.predict_fn(samples))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.num_batches += 1
+        self.num_requests += len(batch)
+        for (_, future), pred in zip(batch, np.split(preds, np.cumsum(sizes)[:-1])):
+            future.set_result(pred)
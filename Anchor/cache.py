@@ -0,0 +1,208 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+import numpy as np
+
+
+class PredictionCache:
+    """
+    Size bounded LRU cache between the samplers and the predict_fn.
+
+    Samples are identified by a hashable key (e.g. the bytes of a tabular row
+    or of a superpixel mask). Only samples whose key is not cached yet are
+    passed to the predict_fn, duplicates within one batch are predicted once.
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        """
+        Args:
+            maxsize (int): Maximal number of cached predictions.
+        """
+        assert maxsize > 0, "maxsize must be higher than 0"
+
+        self.maxsize = maxsize
+        self.hits = 0  # samples served from the cache
+        self.misses = 0  # samples passed to the predict_fn
+        self.__predictions = OrderedDict()
+
+    def __len__(self):
+        return len(self.__predictions)
+
+    def predict(
+        self,
+        predict_fn: Callable[[np.ndarray], np.ndarray],
+        samples: np.ndarray,
+        keys: list[Hashable],
+    ) -> np.ndarray:
+        """
+        Returns the predictions for the samples and calls predict_fn
+        only for samples that are not cached yet.
+
+        Args:
+            predict_fn (Callable[[np.ndarray], np.ndarray]): Black box model predict function.
+            samples (np.ndarray): Samples to be predicted.
+            keys (list[Hashable]): Cache key per sample.
+
+        Returns:
+            np.ndarray: Prediction per sample.
+        """
+        preds = [None] * len(keys)
+        missing = {}  # key -> sample idxs that need the prediction
+
+        for i, key in enumerate(keys):
+            if key in self.__predictions:
+                self.__predictions.move_to_end(key)
+                preds[i] = self.__predictions[key]
+                self.hits += 1
+            elif key in missing:
+                missing[key].append(i)
+                self.hits += 1
+            else:
+                missing[key] = [i]
+                self.misses += 1
+
+        if len(missing) > 0:
+            first_idxs = [idxs[0] for idxs in missing.values()]
+            new_preds = predict_fn(samples[first_idxs])
+
+            for (key, idxs), pred in zip(missing.items(), new_preds):
+                self.__predictions[key] = pred
+                for i in idxs:
+                    preds[i] = pred
+
+            # evict least recently used predictions
+            while len(self.__predictions) > self.maxsize:
+                self.__predictions.popitem(last=False)
+
+        return np.array(preds)
+
+
+class TopKCache:
+    """
+    Persistent, size bounded cache of masked language model predictions.
+
+    Maps a tokenized masked sentence (its token ids) to the top-k token ids
+    and probabilities of every masked token. The arrays are stored as compact
+    int32 / float32 blobs in a sqlite database, so the cache can be shared
+    by several processes and survives between explanations. When the cache
+    holds more than maxsize sentences the least recently used ones are removed.
+    """
+
+    def __init__(self, path: str, maxsize: int = 1000000):
+        """
+        Args:
+            path (str): Path of the sqlite database. Is created if it does not exist.
+            maxsize (int): Maximal number of cached sentences.
+        """
+        assert maxsize > 0, "maxsize must be higher than 0"
+
+        self.path = path
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        with self.__connection:
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS topk ("
+                "key BLOB PRIMARY KEY, num_masks INTEGER, ids BLOB, probs BLOB, used INTEGER)"
+            )
+            self.__connection.execute(
+                "CREATE INDEX IF NOT EXISTS topk_used ON topk (used)"
+            )
+        (self.__clock,) = self.__connection.execute(
+            "SELECT COALESCE(MAX(used), 0) FROM topk"
+        ).fetchone()
+
+    def __len__(self):
+        with self.__lock:
+            return self.__connection.execute("SELECT COUNT(*) FROM topk").fetchone()[0]
+
+    @staticmethod
+    def key(token_ids: np.ndarray) -> bytes:
+        """
+        Cache key of a tokenized sentence.
+
+        Args:
+            token_ids (np.ndarray): Token ids of the masked sentence.
+
+        Returns:
+            bytes: Key
+        """
+        return np.asarray(token_ids, dtype=np.int32).tobytes()
+
+    def get_many(self, keys: list[bytes]) -> dict:
+        """
+        Looks up several sentences.
+
+        Args:
+            keys (list[bytes]): Keys of the sentences (see TopKCache.key).
+
+        Returns:
+            dict: key -> (ids, probs) with arrays of shape (num_masks, k) for every cached key.
+        """
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+
+        with self.__lock, self.__connection:
+            self.__clock += 1
+            # sqlite limits the number of query parameters
+            for start in range(0, len(unique_keys), 500):
+                chunk = unique_keys[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.__connection.execute(
+                    "SELECT key, num_masks, ids, probs FROM topk "
+                    f"WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                self.__connection.execute(
+                    f"UPDATE topk SET used = ? WHERE key IN ({placeholders})",
+                    [self.__clock] + chunk,
+                )
+
+                for key, num_masks, ids, probs in rows:
+                    found[key] = (
+                        np.frombuffer(ids, dtype=np.int32).reshape(num_masks, -1),
+                        np.frombuffer(probs, dtype=np.float32).reshape(num_masks, -1),
+                    )
+
+        self.hits += len(found)
+        self.misses += len(unique_keys) - len(found)
+
+        return found
+
+    def put_many(self, items: dict):
+        """
+        Stores several sentences and evicts the least recently used
+        sentences if the cache is full.
+
+        Args:
+            items (dict): key -> (ids, probs) with arrays of shape (num_masks, k).
+        """
+        with self.__lock, self.__connection:
+            self.__clock += 1
+            self.__connection.executemany(
+                "INSERT OR REPLACE INTO topk VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        key,
+                        len(ids),
+                        np.asarray(ids, dtype=np.int32).tobytes(),
+                        np.asarray(probs, dtype=np.float32).tobytes(),
+                        self.__clock,
+                    )
+                    for key, (ids, probs) in items.items()
+                ],
+            )
+
+            (size,) = self.__connection.execute("SELECT COUNT(*) FROM topk").fetchone()
+            if size > self.maxsize:
+                self.__connection.execute(
+                    "DELETE FROM topk WHERE key IN "
+                    "(SELECT key FROM topk ORDER BY used LIMIT ?)",
+                    (size - self.maxsize,),
+                )
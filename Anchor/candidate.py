@@ -1,4 +1,7 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
 
 
 @dataclass()
@@ -12,6 +15,8 @@ class AnchorCandidate:
     n_samples: int = 0
     positive_samples: int = 0
     coverage: float = -1
+    # packed bitset of the coverage samples covered by this candidate (see CoverageIndex)
+    coverage_bits: Optional[np.ndarray] = field(default=None, repr=False, compare=False)
 
     def update_precision(self, positives: int, n_samples: int):
         """Updatest the precision of this AnchorCandidate.
@@ -0,0 +1,103 @@
+import numpy as np
+
+# number of set bits for every possible byte value
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+class CoverageIndex:
+    """
+    Packed bitset index over the coverage samples.
+
+    For every feature the coverage samples in which the feature is present
+    (coverage mask equals 1) are stored as a packed bitset. The coverage of an
+    anchor is the popcount of the AND over the bitsets of its feature mask.
+    """
+
+    def __init__(self, coverage_data: np.ndarray):
+        """
+        Builds the bitsets once from the coverage masks.
+
+        Args:
+            coverage_data (np.ndarray): Coverage masks of shape (num_samples, num_features)
+                as returned by Sampler.sample.
+        """
+        coverage_data = np.asarray(coverage_data)
+        self.num_samples, self.num_features = coverage_data.shape
+
+        # one packed row per feature, the last row is an all-ones bitset
+        # which is used for empty feature masks
+        feature_bits = np.packbits(coverage_data.T == 1, axis=1)
+        all_bits = np.packbits(np.ones((1, self.num_samples), dtype=bool), axis=1)
+        self.bits = np.vstack([feature_bits, all_bits])
+
+    @classmethod
+    def from_packed(cls, packed_masks: np.ndarray, num_features: int):
+        """
+        Builds the index from coverage masks that are packed along the
+        feature axis (see Sampler.packed_masks).
+
+        Args:
+            packed_masks (np.ndarray): Packed coverage masks of shape (num_samples, ceil(num_features / 8)).
+            num_features (int): Number of features.
+
+        Returns:
+            CoverageIndex: Index over the coverage samples.
+        """
+        return cls(np.unpackbits(packed_masks, axis=1, count=num_features))
+
+    @staticmethod
+    def count(bits: np.ndarray) -> np.ndarray:
+        """
+        Counts the set bits of one or several packed bitsets.
+
+        Args:
+            bits (np.ndarray): Packed bitset(s), the last axis holds the bytes.
+
+        Returns:
+            np.ndarray: Number of set bits per bitset.
+        """
+        return _POPCOUNT[bits].sum(axis=-1)
+
+    def covered(self, feature_mask: list) -> np.ndarray:
+        """
+        Returns the packed bitset of coverage samples that are covered by
+        the given feature mask.
+
+        Args:
+            feature_mask (list): Feature indices of the anchor.
+
+        Returns:
+            np.ndarray: Packed bitset over the coverage samples.
+        """
+        idxs = np.asarray(feature_mask, dtype=int).reshape(-1)
+        if len(idxs) == 0:
+            return self.bits[-1].copy()
+
+        return np.bitwise_and.reduce(self.bits[idxs], axis=0)
+
+    def extend(self, parent_bits: np.ndarray, features: np.ndarray) -> np.ndarray:
+        """
+        Intersects covered-sample bitsets of parent anchors with the bitset
+        of one additional feature each. This is the covered set of the child
+        anchors without touching the rest of their feature masks.
+
+        Args:
+            parent_bits (np.ndarray): Packed bitsets of the parents, shape (num_children, num_bytes).
+            features (np.ndarray): Added feature index per child.
+
+        Returns:
+            np.ndarray: Packed bitsets of the children.
+        """
+        return np.bitwise_and(parent_bits, self.bits[np.asarray(features, dtype=int)])
+
+    def coverage(self, feature_mask: list) -> float:
+        """
+        Calculates the coverage for a single feature mask.
+
+        Args:
+            feature_mask (list): Feature indices of the anchor.
+
+        Returns:
+            float: Coverage
+        """
+        return float(self.count(self.covered(feature_mask)) / self.num_samples)
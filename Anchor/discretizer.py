@@ -0,0 +1,117 @@
+import numpy as np
+
+
+class QuantileDiscretizer:
+    """
+    Discretizes the columns of a tabular dataset into quantile bins
+    (e.g. quartiles or deciles). Categorical columns keep one bin per
+    category.
+
+    The bins are stored as uint8 codes. The discretizer is fitted once
+    and can be reused for every explanation on the same dataset, the
+    codes of the fitted dataset are computed only once.
+    """
+
+    def __init__(
+        self,
+        dataset: np.ndarray,
+        column_names: list,
+        categorical_features: list = None,
+        num_bins: int = 4,
+    ):
+        """
+        Fits the bin edges of every column.
+
+        Args:
+            dataset (np.ndarray): Tabular dataset with continuous and categorical columns.
+            column_names (list): Columns names of the dataset.
+            categorical_features (list, optional): Indices of the categorical columns.
+            num_bins (int): Number of quantile bins per continuous column (4 for quartiles, 10 for deciles).
+        """
+        assert 1 < num_bins <= 255, "num_bins must be between 2 and 255"
+        assert (
+            len(column_names) == dataset.shape[1]
+        ), "column_names length must match dataset column dimension."
+
+        self.dataset = dataset
+        self.column_names = column_names
+        self.categorical_features = set(categorical_features or [])
+        self.num_bins = num_bins
+        self.__codes = None
+
+        # per column the upper bin edges (continuous) or the categories (categorical)
+        self.edges = []
+        quantiles = np.arange(1, num_bins) / num_bins
+        for column in range(dataset.shape[1]):
+            values = np.asarray(dataset[:, column])
+            if column in self.categorical_features:
+                edges = np.unique(values)
+                assert (
+                    len(edges) <= 255
+                ), "Categorical columns can have at most 255 values."
+            else:
+                edges = np.unique(np.quantile(values, quantiles))
+            self.edges.append(edges)
+
+    @property
+    def codes(self) -> np.ndarray:
+        """
+        Codes of the fitted dataset, computed on first use.
+
+        Returns:
+            np.ndarray: uint8 codes of shape (num_rows, num_columns)
+        """
+        if self.__codes is None:
+            self.__codes = self.transform(self.dataset)
+
+        return self.__codes
+
+    def transform(self, data: np.ndarray) -> np.ndarray:
+        """
+        Looks up the bin of every value. Continuous values v get the
+        bin i with edges[i - 1] < v <= edges[i], categories their index.
+        Unknown categories get the code 255.
+
+        Args:
+            data (np.ndarray): Rows of shape (num_rows, num_columns) or a single row.
+
+        Returns:
+            np.ndarray: uint8 codes of the same shape
+        """
+        data = np.asarray(data)
+        rows = data.reshape(-1, data.shape[-1])
+
+        codes = np.empty(rows.shape, dtype=np.uint8)
+        for column, edges in enumerate(self.edges):
+            values = rows[:, column]
+            pos = np.searchsorted(edges, values)
+            if column in self.categorical_features:
+                known = edges[np.minimum(pos, len(edges) - 1)] == values
+                pos = np.where(known, pos, 255)
+            codes[:, column] = pos
+
+        return codes.reshape(data.shape)
+
+    def describe(self, column: int, code: int) -> str:
+        """
+        Human readable range of a bin.
+
+        Args:
+            column (int): Column index.
+            code (int): Bin code.
+
+        Returns:
+            str: e.g. "Age <= 22.00", "22.00 < Age <= 35.00" or "Sex = 1.0"
+        """
+        name = self.column_names[column]
+        edges = self.edges[column]
+
+        if column in self.categorical_features:
+            value = edges[code] if code < len(edges) else "unknown"
+            return f"{name} = {value}"
+        if code == 0:
+            return f"{name} <= {edges[0]:.2f}"
+        if code == len(edges):
+            return f"{name} > {edges[-1]:.2f}"
+
+        return f"{edges[code - 1]:.2f} < {name} <= {edges[code]:.2f}"
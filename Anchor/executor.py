@@ -0,0 +1,349 @@
+import io
+import mmap
+import pickle
+import weakref
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Tuple
+
+import numpy as np
+
+from .candidate import AnchorCandidate
+
+
+def _perturb(
+    sampler: any,
+    feature_mask: list,
+    num_samples: int,
+    rng: np.random.Generator,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Generates the pertubations of one pull with a fork of the sampler
+    that draws from rng.
+    """
+    return sampler.fork(rng).perturb(AnchorCandidate(list(feature_mask)), num_samples)
+
+
+class SamplingExecutor:
+    """
+    Abstract executor the pertubations of the pulled arms are dispatched
+    to (see Sampler.sample_batch). Use create(type) to initialise the
+    subclasses: (``serial``), (``thread``) or (``process``).
+
+    Every pull draws from its own random generator, which is spawned from
+    the samplers generator, so the samples do not depend on the executor
+    or the number of workers. The predict_fn is always called by the
+    process that owns the sampler, while the workers generate the
+    pertubations of the next arms.
+    """
+
+    subclasses = {}
+
+    type: str
+
+    def __init_subclass__(cls, **kwargs):
+        """
+        Registers every subclass in the subclass-dict.
+        """
+        super().__init_subclass__(**kwargs)
+        cls.subclasses[cls.type] = cls
+
+    @classmethod
+    def create(cls, type: str, **kwargs) -> "SamplingExecutor":
+        """
+        Creates subclass depending on type.
+
+        Args:
+            type (str): (``serial``), (``thread``) or (``process``).
+            **kwargs: Arguments of the subclass, e.g. (``n_jobs``).
+
+        Returns:
+            SamplingExecutor: Executor of the given type.
+        """
+        if type not in cls.subclasses:
+            raise ValueError("Unknown executor {}".format(type))
+
+        return cls.subclasses[type](**kwargs)
+
+    def bind(self, sampler: any):
+        """
+        Called after the input of the sampler is set. Executors that do
+        not share the memory of the sampler copy its state here.
+
+        Args:
+            sampler (Sampler): Sampler whose pulls are dispatched.
+        """
+
+    def submit(
+        self,
+        sampler: any,
+        candidate: AnchorCandidate,
+        num_samples: int,
+        rng: np.random.Generator,
+    ) -> Future:
+        """
+        Starts generating num_samples pertubations for the candidate.
+
+        Args:
+            sampler (Sampler): Sampler that generates the pertubations.
+            candidate (AnchorCandidate): AnchorCandidate which contains the features to be fixated.
+            num_samples (int): Number of samples.
+            rng (np.random.Generator): Random generator of this pull.
+
+        Returns:
+            Future: Future of the (samples, coverage_masks) of the pull.
+        """
+        raise NotImplementedError
+
+    def shutdown(self):
+        """
+        Stops the workers.
+        """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+
+class SerialExecutor(SamplingExecutor):
+    """
+    Generates the pertubations on the calling thread. Gives the same
+    samples as the parallel executors.
+    """
+
+    type: str = "serial"
+
+    def __init__(self, n_jobs: int = None):
+        """
+        Args:
+            n_jobs (int, optional): Ignored, there is a single worker.
+        """
+
+    def submit(
+        self,
+        sampler: any,
+        candidate: AnchorCandidate,
+        num_samples: int,
+        rng: np.random.Generator,
+    ) -> Future:
+        future = Future()
+        future.set_result(_perturb(sampler, candidate.feature_mask, num_samples, rng))
+
+        return future
+
+
+class ThreadExecutor(SamplingExecutor):
+    """
+    Generates the pertubations in a thread pool. The workers share the
+    sampler (dataset, image, bert model) with the calling thread, every
+    pull runs on a fork with its own random generator and buffers. Pays
+    off where the pertubation releases the GIL, e.g. for the numpy heavy
+    image generation and the bert forward passes of the text sampler.
+    """
+
+    type: str = "thread"
+
+    def __init__(self, n_jobs: int = None):
+        """
+        Args:
+            n_jobs (int, optional): Number of threads. Defaults to the ThreadPoolExecutor default.
+        """
+        self.__pool = ThreadPoolExecutor(max_workers=n_jobs)
+
+    def submit(
+        self,
+        sampler: any,
+        candidate: AnchorCandidate,
+        num_samples: int,
+        rng: np.random.Generator,
+    ) -> Future:
+        return self.__pool.submit(
+            _perturb, sampler, candidate.feature_mask, num_samples, rng
+        )
+
+    def shutdown(self):
+        self.__pool.shutdown()
+
+
+class ProcessExecutor(SamplingExecutor):
+    """
+    Generates the pertubations in a process pool. On bind the state of the
+    sampler is pickled once, without its predict_fn and prediction cache.
+    Arrays of at least min_shared_bytes bytes (dataset, discretized codes,
+    value index, coverage bitmap, images) are placed into shared memory
+    instead, memory mapped datasets are reopened by the workers. Arrays
+    that survive several binds (e.g. the dataset of a fitted explainer)
+    are shared only once.
+
+    The samples are sent back to the calling process, so it pays off if
+    generating them costs more than copying them.
+    """
+
+    type: str = "process"
+
+    def __init__(self, n_jobs: int = None, min_shared_bytes: int = 65536):
+        """
+        Args:
+            n_jobs (int, optional): Number of processes. Defaults to the ProcessPoolExecutor default.
+            min_shared_bytes (int): Arrays of at least this size are passed via shared memory.
+        """
+        self.min_shared_bytes = min_shared_bytes
+
+        self.__pool = ProcessPoolExecutor(max_workers=n_jobs)
+        self.__sampler = None
+        self.__state = None  # pickled state of the bound sampler
+        self.__version = 0
+        self.__shared = {}  # id(array) -> (array, SharedMemory)
+        self.__finalizer = weakref.finalize(
+            self, ProcessExecutor.__release, self.__pool, self.__shared
+        )
+
+    def bind(self, sampler: any):
+        # object.__getstate__ only exists from python 3.11 on
+        state = dict(getattr(sampler, "__getstate__", lambda: sampler.__dict__)())
+        for name in ("predict_fn", "cache", "executor"):
+            state.pop(name, None)
+
+        buffer = io.BytesIO()
+        pickler = _SharedMemoryPickler(buffer, self.__shared, self.min_shared_bytes)
+        pickler.dump((type(sampler), state))
+
+        # shared memory of arrays the sampler does not use anymore
+        for key in set(self.__shared) - pickler.used:
+            _, shm = self.__shared.pop(key)
+            shm.close()
+            shm.unlink()
+
+        self.__sampler = sampler
+        self.__state = buffer.getvalue()
+        self.__version += 1
+
+    def submit(
+        self,
+        sampler: any,
+        candidate: AnchorCandidate,
+        num_samples: int,
+        rng: np.random.Generator,
+    ) -> Future:
+        if self.__sampler is not sampler:
+            self.bind(sampler)
+
+        return self.__pool.submit(
+            _perturb_in_worker,
+            (id(self), self.__version),
+            self.__state,
+            candidate.feature_mask,
+            num_samples,
+            rng,
+        )
+
+    def shutdown(self):
+        self.__finalizer()
+
+    @staticmethod
+    def __release(pool: ProcessPoolExecutor, shared: dict):
+        """
+        Stops the workers and frees the shared memory.
+        """
+        pool.shutdown()
+        for _, shm in shared.values():
+            shm.close()
+            shm.unlink()
+        shared.clear()
+
+
+class _SharedMemoryPickler(pickle.Pickler):
+    """
+    Pickles large arrays as references to shared memory and memory
+    mapped arrays as references to their file.
+    """
+
+    def __init__(self, file: io.BytesIO, shared: dict, min_shared_bytes: int):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.shared = shared
+        self.min_shared_bytes = min_shared_bytes
+        self.used = set()
+
+    def persistent_id(self, obj: any):
+        if type(obj) is np.memmap and isinstance(obj.base, mmap.mmap):
+            return ("memmap", obj.filename, obj.dtype.str, obj.shape, obj.offset)
+        if (
+            not isinstance(obj, np.ndarray)
+            or obj.dtype.hasobject
+            or obj.nbytes < self.min_shared_bytes
+        ):
+            return None
+
+        key = id(obj)
+        if key not in self.shared:
+            shm = SharedMemory(create=True, size=obj.nbytes)
+            np.ndarray(obj.shape, obj.dtype, buffer=shm.buf)[...] = obj
+            self.shared[key] = (obj, shm)
+        self.used.add(key)
+
+        return ("shm", self.shared[key][1].name, obj.dtype.str, obj.shape)
+
+
+class _SharedMemoryUnpickler(pickle.Unpickler):
+    """
+    Resolves the references of the _SharedMemoryPickler. Attached shared
+    memory blocks are kept in attached (name -> SharedMemory).
+    """
+
+    def __init__(self, file: io.BytesIO, attached: dict):
+        super().__init__(file)
+        self.attached = attached
+        self.used = set()
+
+    def persistent_load(self, pid: tuple) -> np.ndarray:
+        if pid[0] == "memmap":
+            _, filename, dtype, shape, offset = pid
+            return np.memmap(filename, dtype, "r", offset, shape)
+
+        _, name, dtype, shape = pid
+        if name not in self.attached:
+            self.attached[name] = SharedMemory(name)
+        self.used.add(name)
+
+        array = np.ndarray(shape, dtype, buffer=self.attached[name].buf)
+        array.flags.writeable = False
+
+        return array
+
+
+# sampler of the last bound state and the shared memory it uses (per process worker)
+_worker_version = None
+_worker_sampler = None
+_worker_shared = {}
+
+
+def _perturb_in_worker(
+    version: tuple,
+    state: bytes,
+    feature_mask: list,
+    num_samples: int,
+    rng: np.random.Generator,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Generates the pertubations of one pull within a process worker. The
+    sampler is restored once per bound state.
+    """
+    global _worker_version, _worker_sampler
+
+    if _worker_version != version:
+        _worker_sampler = None  # releases the arrays of the previous state
+        unpickler = _SharedMemoryUnpickler(io.BytesIO(state), _worker_shared)
+        cls, sampler_state = unpickler.load()
+        for name in set(_worker_shared) - unpickler.used:
+            _worker_shared.pop(name).close()
+
+        _worker_sampler = cls.__new__(cls)
+        if hasattr(_worker_sampler, "__setstate__"):
+            _worker_sampler.__setstate__(sampler_state)
+        else:
+            _worker_sampler.__dict__.update(sampler_state)
+        _worker_version = version
+
+    return _perturb(_worker_sampler, feature_mask, num_samples, rng)
@@ -1,22 +1,60 @@
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from enum import Enum, auto
-from typing import Callable, Optional, Protocol, Tuple, Union
+from typing import TYPE_CHECKING, Callable, Optional, Protocol, Tuple, Union
 
-import matplotlib.pyplot as plt
 import numpy as np
-import spacy
-import torch
-from skimage.segmentation import quickshift
-from transformers import DistilBertForMaskedLM, DistilBertTokenizer
 
+from .cache import PredictionCache, TopKCache
 from .candidate import AnchorCandidate
+from .discretizer import QuantileDiscretizer
+from .executor import SamplingExecutor
+from .sources import ValueIndex, open_dataset
 
+# the backends of the image (skimage) and text (torch, transformers) samplers
+# are imported when these samplers are used, so tabular explanations do not
+# load them
+if TYPE_CHECKING:
+    from transformers import DistilBertForMaskedLM, DistilBertTokenizer
 
-def exp_normalize(x):
-    b = x.max()
+
+def exp_normalize(x, axis=-1):
+    b = x.max(axis=axis, keepdims=True)
     y = np.exp(x - b)
-    return y / y.sum()
+    return y / y.sum(axis=axis, keepdims=True)
+
+
+# masked language models that are already loaded in this process
+_masked_lms = {}
+_masked_lms_lock = threading.Lock()
+
+
+def load_masked_lm(
+    name: str = "distilbert-base-cased",
+) -> Tuple["DistilBertTokenizer", "DistilBertForMaskedLM"]:
+    """
+    Loads the tokenizer and the masked language model only once per
+    process. Further calls return the same (shared) handle.
+
+    Args:
+        name (str): Name of the pretrained distilbert model.
+
+    Returns:
+        Tuple[DistilBertTokenizer, DistilBertForMaskedLM]: Tokenizer and model.
+    """
+    from transformers import DistilBertForMaskedLM, DistilBertTokenizer
+
+    with _masked_lms_lock:
+        if name not in _masked_lms:
+            tokenizer = DistilBertTokenizer.from_pretrained(name)
+            bert = DistilBertForMaskedLM.from_pretrained(name)
+            bert.eval()
+            _masked_lms[name] = (tokenizer, bert)
+
+        return _masked_lms[name]
 
 
 class Tasktype(Enum):
@@ -39,6 +77,18 @@ class Sampler:
 
     subclasses = {}
 
+    # optional prediction cache between the sampler and the predict_fn
+    cache: Optional[PredictionCache] = None
+
+    # random generator every pertubation is drawn from
+    rng: np.random.Generator
+
+    # coverage masks are packed along the feature axis (np.packbits)
+    packed_masks: bool = False
+
+    # optional executor the pertubations of sample_batch are dispatched to
+    executor: Optional[SamplingExecutor] = None
+
     def __init_subclass__(cls, **kwargs):
         """
         Registers every subclass in the subclass-dict.
@@ -53,6 +103,9 @@ class Sampler:
         input: any,
         predict_fn: Callable,
         task_specific: dict,
+        cache: Optional[PredictionCache] = None,
+        rng: Optional[np.random.Generator] = None,
+        executor: Optional[SamplingExecutor] = None,
         **kwargs
     ):
         """
@@ -60,15 +113,252 @@ class Sampler:
 
         Args:
             typ: Tasktype
+            cache (PredictionCache, optional): Prediction cache used by the sampler.
+            rng (np.random.Generator, optional): Random generator of the sampler. Defaults to a fresh generator.
+            executor (SamplingExecutor, optional): Executor the pertubations of sample_batch are generated by.
         Returns:
             Subclass that is used for the given Tasktype.
         """
         if type not in cls.subclasses:
             raise ValueError("Bad message type {}".format(type))
 
-        return cls.subclasses[type](
+        sampler = cls.subclasses[type](
             input, predict_fn, **task_specific
         )  # every sampler needs input and predict function
+        sampler.cache = cache
+        sampler.rng = rng if rng is not None else np.random.default_rng()
+        sampler.executor = executor
+
+        return sampler
+
+    def fork(self, rng: np.random.Generator) -> "Sampler":
+        """
+        Shallow copy of the sampler that draws from rng. The copy shares
+        the input, the dataset, the models and their caches with the
+        sampler, so it can generate pertubations on another thread (see
+        SamplingExecutor). Unlike copy.copy it does not go through
+        __getstate__, which only prepares the sampler for pickling.
+
+        Args:
+            rng (np.random.Generator): Random generator of the copy.
+
+        Returns:
+            Sampler: Copy of the sampler
+        """
+        sampler = self.__class__.__new__(self.__class__)
+        sampler.__dict__.update(self.__dict__)
+        sampler.rng = rng
+
+        return sampler
+
+    def forks(self, rngs: Optional[list], num_candidates: int) -> list["Sampler"]:
+        """
+        Sampler per candidate of a batch: a fork per generator or self
+        for all candidates if no generators are given.
+
+        Args:
+            rngs (list[np.random.Generator], optional): Random generator per candidate.
+            num_candidates (int): Number of candidates.
+
+        Returns:
+            list[Sampler]: Sampler per candidate.
+        """
+        if rngs is None:
+            return [self] * num_candidates
+
+        return [self.fork(rng) for rng in rngs]
+
+    def set_input(self, input: any):
+        """
+        Sets the instance that is explained. Everything that only depends
+        on the dataset, the model or the task settings is kept, so one
+        sampler can explain many instances (see Anchor.fit).
+
+        Args:
+            input (any): Instance that is to be explained.
+        """
+        raise NotImplementedError
+
+    def fit_coverage(self, num_samples: int):
+        """
+        Fixes the coverage samples for all following instances if the
+        sampler supports it. By default they are drawn per instance.
+
+        Args:
+            num_samples (int): Number of coverage samples.
+        """
+
+    def coverage_masks(self, num_samples: int) -> np.ndarray:
+        """
+        Coverage masks of num_samples samples of the empty anchor.
+
+        Args:
+            num_samples (int): Number of coverage samples.
+
+        Returns:
+            np.ndarray: Coverage masks
+        """
+        _, masks = self.sample(AnchorCandidate(feature_mask=[]), num_samples, False)
+
+        return masks
+
+    def compute_labels(self, samples: np.ndarray, masks: np.ndarray) -> np.ndarray:
+        """
+        Predicts the samples with the black box model and compares
+        the predictions with the label of the input. Samples that
+        are within the prediction cache are not predicted again.
+
+        Args:
+            samples (np.ndarray): Pertubated samples.
+            masks (np.ndarray): Coverage masks of the samples.
+
+        Returns:
+            np.ndarray: 1 where the prediction equals the input label else 0.
+        """
+        if self.cache is None:
+            preds = self.predict_samples(samples)
+        else:
+            preds = self.cache.predict(
+                self.predict_samples, samples, self.cache_keys(samples, masks)
+            )
+
+        return (preds == self.label).astype(int)
+
+    def predict_samples(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Passes the samples to the predict_fn.
+
+        Args:
+            samples (np.ndarray): Pertubated samples.
+
+        Returns:
+            np.ndarray: Predictions of the black box model.
+        """
+        return self.predict_fn(samples)
+
+    def cache_keys(self, samples: np.ndarray, masks: np.ndarray) -> list:
+        """
+        Keys that identify the samples within the prediction cache.
+        By default the raw bytes of each sample.
+
+        Args:
+            samples (np.ndarray): Pertubated samples.
+            masks (np.ndarray): Coverage masks of the samples.
+
+        Returns:
+            list: Hashable key per sample.
+        """
+        return [sample.tobytes() for sample in samples]
+
+    def sample_batch(
+        self, candidates: list[AnchorCandidate], num_samples: int
+    ) -> Tuple[list[AnchorCandidate], list[np.ndarray]]:
+        """
+        Generates num_samples samples for each candidate and predicts
+        all of them with a single predict_fn call. The labels are split
+        back to the candidates afterwards, so that the precision of every
+        candidate is updated exactly as with separate sample calls.
+
+        Args:
+            candidates (list[AnchorCandidate]): AnchorCandidates (arms) to be pulled. The same
+                candidate may occur several times.
+            num_samples (int): Number of samples per candidate.
+
+        Returns:
+            Tuple[list[AnchorCandidate], list[np.ndarray]]: Structure: [AnchorCandidates, coverage_masks]
+        """
+        if self.executor is not None:
+            return self.__sample_batch_executor(candidates, num_samples)
+
+        # same generators as the executors, so the samples do not depend on them
+        samples, masks = self.perturb_batch(
+            candidates, num_samples, self.rng.spawn(len(candidates))
+        )
+        self.label_batch(candidates, samples, masks, num_samples)
+
+        return candidates, np.split(masks, len(candidates))
+
+    def label_batch(
+        self,
+        candidates: list[AnchorCandidate],
+        samples: np.ndarray,
+        masks: np.ndarray,
+        num_samples: int,
+    ):
+        """
+        Predicts already generated samples (num_samples per candidate, in
+        the order of the candidates) with a single predict_fn call and
+        updates the precision of the candidates.
+
+        Args:
+            candidates (list[AnchorCandidate]): AnchorCandidates the samples belong to.
+            samples (np.ndarray): Pertubated samples of all candidates.
+            masks (np.ndarray): Coverage masks of the samples.
+            num_samples (int): Number of samples per candidate.
+        """
+        labels = self.compute_labels(samples, masks)
+
+        for candidate, arm_labels in zip(candidates, np.split(labels, len(candidates))):
+            candidate.update_precision(np.sum(arm_labels), num_samples)
+
+    def __sample_batch_executor(
+        self, candidates: list[AnchorCandidate], num_samples: int
+    ) -> Tuple[list[AnchorCandidate], list[np.ndarray]]:
+        """
+        sample_batch with the pertubations generated by self.executor.
+        The pertubations of all candidates are started at once, every
+        candidate is predicted as soon as its samples are ready while the
+        workers still generate the samples of the following candidates.
+
+        Args:
+            candidates (list[AnchorCandidate]): AnchorCandidates (arms) to be pulled.
+            num_samples (int): Number of samples per candidate.
+
+        Returns:
+            Tuple[list[AnchorCandidate], list[np.ndarray]]: Structure: [AnchorCandidates, coverage_masks]
+        """
+        futures = [
+            self.executor.submit(self, candidate, num_samples, rng)
+            for candidate, rng in zip(candidates, self.rng.spawn(len(candidates)))
+        ]
+
+        masks = []
+        for candidate, future in zip(candidates, futures):
+            samples, arm_masks = future.result()
+            labels = self.compute_labels(samples, arm_masks)
+            candidate.update_precision(np.sum(labels), num_samples)
+            masks.append(arm_masks)
+
+        return candidates, masks
+
+    def perturb_batch(
+        self,
+        candidates: list[AnchorCandidate],
+        num_samples: int,
+        rngs: list[np.random.Generator] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Generates num_samples samples for each candidate (via self.perturb)
+        and concatenates them.
+
+        Args:
+            candidates (list[AnchorCandidate]): AnchorCandidates for which samples are generated.
+            num_samples (int): Number of samples per candidate.
+            rngs (list[np.random.Generator], optional): Random generator per candidate. The samples of
+                a candidate equal the samples of a fork (see Sampler.fork) that draws from its generator.
+                Defaults to self.rng for all candidates.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Structure: [samples, coverage_masks]
+        """
+        pertubations = [
+            sampler.perturb(c, num_samples)
+            for sampler, c in zip(self.forks(rngs, len(candidates)), candidates)
+        ]
+        samples = np.concatenate([samples for samples, _ in pertubations], axis=0)
+        masks = np.concatenate([masks for _, masks in pertubations], axis=0)
+
+        return samples, masks
 
 
 class TabularSampler(Sampler):
@@ -87,6 +377,10 @@ class TabularSampler(Sampler):
         predict_fn: Callable[[any], np.array],
         dataset: any,
         column_names: list,
+        packed_masks: bool = False,
+        conditional: bool = False,
+        discretizer: QuantileDiscretizer = None,
+        min_support: int = None,
     ):
         """
         Initialises TabularSampler with the given
@@ -98,8 +392,21 @@ class TabularSampler(Sampler):
         Args:
             input (any): Tabular row that is to be explained.
             predict_fn (Callable[[any], np.array]): Black box model predict function.
-            dataset (any): Tabular dataset from which samples will be collected. Expected to be discretized.
+            dataset (any): Tabular dataset from which samples will be collected. Expected to be discretized
+                unless a discretizer is given. Either a numpy array (or np.memmap) or a source that is opened without loading it
+                into memory: path of a .npy file, of an Arrow IPC / Parquet file or a pyarrow.Table.
             column_names (list): Columns names of the dataset.
+            packed_masks (bool): Return the coverage masks packed along the feature axis (np.packbits)
+                instead of one byte per feature. Reduces the memory of the masks of wide tables by 8.
+            conditional (bool): Draw the samples of a candidate only from dataset rows that already
+                hold the input values of the candidates features (see ValueIndex) instead of overwriting
+                these features in random rows. Falls back to overwriting if less than min_support rows match.
+            discretizer (QuantileDiscretizer, optional): Fitted discretizer for continuous datasets. The rows
+                passed to predict_fn keep their values, but coverage and conditional sampling compare the
+                bins (uint8 codes) of the rows with the bins of the input.
+            min_support (int, optional): Minimum number of matching rows for conditional sampling. Defaults
+                to the number of samples of the pull, so the samples of rare values are not drawn from a
+                handful of rows (which would give these candidates a precision close to 1).
         """
 
         if dataset is None:
@@ -107,17 +414,109 @@ class TabularSampler(Sampler):
         if column_names is None:
             assert "Column names must be given for tabular explaination."
 
+        if not isinstance(dataset, np.ndarray):
+            dataset = open_dataset(dataset)
+
         self.predict_fn = predict_fn
-        self.input = input
-        self.label = predict_fn(input)
         self.dataset = dataset
         self.features = column_names
         self.num_features = self.dataset.shape[1]
+        self.packed_masks = packed_masks
+        self.discretizer = discretizer
+        self.min_support = min_support
 
         assert (
             len(column_names) == self.num_features
         ), "column_names length must match dataset column dimension."
 
+        # rows are compared with the input in these values (bins if discretized)
+        self.codes = self.dataset
+        if discretizer is not None and type(self.dataset) is np.ndarray:
+            self.codes = (
+                discretizer.codes
+                if self.dataset is discretizer.dataset
+                else discretizer.transform(self.dataset)
+            )
+
+        # reused output buffer for pertubated rows
+        self.__sample_buffer = np.empty((0, self.num_features), dtype=dataset.dtype)
+
+        # value -> rows index for conditional sampling
+        self.value_index = None
+        if conditional:
+            # out of memory datasets are discretized while the index is built
+            transform = None
+            if discretizer is not None and self.codes is self.dataset:
+                transform = discretizer.transform
+            self.value_index = ValueIndex(self.codes, transform=transform)
+
+        # coverage pool (see fit_coverage)
+        self.coverage_rows = None
+        self.coverage_codes = None
+
+        if input is not None:
+            self.set_input(input)
+
+    def set_input(self, input: any):
+        """
+        Sets the row that is explained. The dataset, its bins, the
+        value index and the coverage pool are kept. Nothing is computed
+        over the whole dataset, the coverage masks are computed from the
+        drawn rows only.
+
+        Args:
+            input (any): Tabular row of shape (1, num_features) that is to be explained.
+        """
+        self.input = input
+        self.label = self.predict_fn(input)
+        self.input_codes = self.__discretize(input)
+
+        # rows matching the input per feature mask for conditional sampling
+        self.__matching_rows = {}
+
+    def fork(self, rng: np.random.Generator) -> "TabularSampler":
+        """
+        Shallow copy of the sampler with its own sample buffer (see Sampler.fork).
+        """
+        sampler = super().fork(rng)
+        sampler.__sample_buffer = np.empty((0, self.num_features), self.dataset.dtype)
+
+        return sampler
+
+    def fit_coverage(self, num_samples: int):
+        """
+        Draws the coverage pool once. The coverage masks of every
+        explained row are computed from the (binned) pool rows.
+
+        Args:
+            num_samples (int): Number of coverage samples.
+        """
+        self.coverage_rows = self.__sample_idxs(AnchorCandidate([]), num_samples)
+        rows = np.empty((num_samples, self.num_features), dtype=self.dataset.dtype)
+        self.coverage_codes = self.__discretize(
+            self.__read_rows(self.coverage_rows, rows)
+        )
+
+    def coverage_masks(self, num_samples: int) -> np.ndarray:
+        """
+        Coverage masks of num_samples samples of the empty anchor. Uses
+        the coverage pool if fit_coverage was called with num_samples.
+
+        Args:
+            num_samples (int): Number of coverage samples.
+
+        Returns:
+            np.ndarray: Coverage masks
+        """
+        if self.coverage_rows is None or len(self.coverage_rows) != num_samples:
+            return super().coverage_masks(num_samples)
+
+        masks = self.coverage_codes != self.input_codes
+        if self.packed_masks:
+            return np.packbits(masks, axis=1)
+
+        return masks.view(np.uint8)
+
     def sample(
         self,
         candidate: AnchorCandidate,
@@ -139,34 +538,219 @@ class TabularSampler(Sampler):
             Tuple[AnchorCandidate, np.ndarray]: Structure: [AnchorCandiate, coverage_mask]. In case
             calculate_labels is False return [None, coverage_mask].
         """
+        sample_idxs = self.__sample_idxs(candidate, num_samples)
 
-        if self.dataset.shape[0] > num_samples:
-            assert "Batch size must be smaller or equal to dataset rows."
+        # in memory codes give the masks without reading the rows
+        if not calculate_labels and type(self.codes) is np.ndarray:
+            return None, self.__coverage_masks([candidate], sample_idxs)
 
-        # pertubate
-        sample_idxs = np.random.choice(
-            self.dataset.shape[0], size=num_samples, replace=False
+        samples, masks = self.perturb_batch(
+            [candidate], num_samples, sample_idxs=sample_idxs
         )
 
-        # fixiate feature mask
-        samples = np.copy(self.dataset[sample_idxs])
-        samples[:, candidate.feature_mask] = self.input[0, candidate.feature_mask]
-
-        # calculate converage mask
-        masks = (samples[:, :] != self.input).astype(int)
-
         if not calculate_labels:
             return None, masks
 
         # predict samples
-        preds = self.predict_fn(samples)
-        labels = (preds == self.label).astype(int)
+        labels = self.compute_labels(samples, masks)
 
         # update candidate
         candidate.update_precision(np.sum(labels), num_samples)
 
         return candidate, masks
 
+    def perturb(
+        self, candidate: AnchorCandidate, num_samples: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Generates num_samples pertubated rows for the candidate without
+        predicting them.
+
+        Args:
+            candidate (AnchorCandidate): AnchorCandiate which contains the features to be fixated.
+            num_samples (int): Number of samples that shall be generated.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Structure: [samples, coverage_mask]
+        """
+        samples, masks = self.perturb_batch([candidate], num_samples)
+
+        return samples.copy(), masks
+
+    def perturb_batch(
+        self,
+        candidates: list[AnchorCandidate],
+        num_samples: int,
+        rngs: list[np.random.Generator] = None,
+        sample_idxs: np.ndarray = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Generates num_samples pertubated rows for each candidate. The
+        rows of all candidates are gathered at once into the reused
+        sample buffer, so the returned samples are only valid until the
+        next call. The coverage masks of in memory datasets are taken
+        from the (binned) codes of the drawn rows, out of memory rows are
+        binned after reading them.
+
+        Args:
+            candidates (list[AnchorCandidate]): AnchorCandidates for which samples are generated.
+            num_samples (int): Number of samples per candidate.
+            rngs (list[np.random.Generator], optional): Random generator per candidate (see Sampler.perturb_batch).
+            sample_idxs (np.ndarray, optional): Dataset rows to use. Drawn per candidate if not given.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Structure: [samples, coverage_masks]
+        """
+        if sample_idxs is None:
+            samplers = self.forks(rngs, len(candidates))
+            sample_idxs = np.concatenate(
+                [
+                    sampler.__sample_idxs(c, num_samples)
+                    for sampler, c in zip(samplers, candidates)
+                ]
+            )
+
+        if self.__sample_buffer.shape[0] < len(sample_idxs):
+            self.__sample_buffer = np.empty(
+                (len(sample_idxs), self.num_features), dtype=self.dataset.dtype
+            )
+        samples = self.__read_rows(
+            sample_idxs, self.__sample_buffer[: len(sample_idxs)]
+        )
+
+        # fixiate feature masks
+        for i, candidate in enumerate(candidates):
+            rows = slice(i * num_samples, (i + 1) * num_samples)
+            samples[rows, candidate.feature_mask] = self.input[
+                0, candidate.feature_mask
+            ]
+
+        if type(self.codes) is not np.ndarray:
+            masks = self.__discretize(samples) != self.input_codes
+            if self.packed_masks:
+                return samples, np.packbits(masks, axis=1)
+
+            return samples, masks.view(np.uint8)
+
+        return samples, self.__coverage_masks(candidates, sample_idxs)
+
+    def __read_rows(self, sample_idxs: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """
+        Reads the given dataset rows. Out of memory datasets are read
+        once per distinct row in row order.
+
+        Args:
+            sample_idxs (np.ndarray): Dataset rows.
+            out (np.ndarray): Buffer of shape (len(sample_idxs), num_features) the rows are written to.
+
+        Returns:
+            np.ndarray: out
+        """
+        if type(self.dataset) is np.ndarray:
+            return np.take(self.dataset, sample_idxs, axis=0, out=out)
+
+        unique_idxs, inverse = np.unique(sample_idxs, return_inverse=True)
+        return np.take(self.dataset[unique_idxs], inverse, axis=0, out=out)
+
+    def __sample_idxs(self, candidate: AnchorCandidate, num_samples: int) -> np.ndarray:
+        """
+        Draws num_samples distinct dataset rows. Generator.choice only
+        materializes a permutation of all rows if num_samples is a large
+        fraction of the dataset, otherwise it uses a set based sampling.
+
+        In conditional mode the rows are drawn from the rows that match
+        the input in the candidates features, with replacement if there
+        are less matching rows than samples. Candidates with less than
+        min_support matching rows overwrite their features in random rows.
+
+        Args:
+            candidate (AnchorCandidate): AnchorCandiate which contains the features to be fixated.
+            num_samples (int): Number of rows.
+
+        Returns:
+            np.ndarray: Row indices
+        """
+        if self.value_index is not None and len(candidate.feature_mask) > 0:
+            rows = self.__get_matching_rows(candidate.feature_mask)
+            min_support = num_samples if self.min_support is None else self.min_support
+            if len(rows) >= max(min_support, 1):
+                return rows[
+                    self.rng.choice(
+                        len(rows), size=num_samples, replace=len(rows) < num_samples
+                    )
+                ]
+
+        if self.dataset.shape[0] > num_samples:
+            assert "Batch size must be smaller or equal to dataset rows."
+
+        return self.rng.choice(self.dataset.shape[0], size=num_samples, replace=False)
+
+    def __get_matching_rows(self, feature_mask: list) -> np.ndarray:
+        """
+        Rows that hold the input values of all features in the feature
+        mask. Results are cached per feature mask, the rows of a mask are
+        derived from the rows of its parent mask (all but the last feature)
+        if these are cached.
+
+        Args:
+            feature_mask (list): Features of the candidate.
+
+        Returns:
+            np.ndarray: Sorted row ids
+        """
+        key = tuple(feature_mask)
+        if key not in self.__matching_rows:
+            parent = self.__matching_rows.get(key[:-1])
+            features = key[-1:] if parent is not None else key
+            self.__matching_rows[key] = self.value_index.matching_rows(
+                features, self.input_codes[0, list(features)], parent
+            )
+
+        return self.__matching_rows[key]
+
+    def __discretize(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Bins of the rows if a discretizer is used, else the rows itself.
+
+        Args:
+            rows (np.ndarray): Tabular rows.
+
+        Returns:
+            np.ndarray: Values the coverage is computed on.
+        """
+        if self.discretizer is None:
+            return rows
+
+        return self.discretizer.transform(rows)
+
+    def __coverage_masks(
+        self, candidates: list[AnchorCandidate], sample_idxs: np.ndarray
+    ) -> np.ndarray:
+        """
+        Coverage masks (1 where a sample differs from the input) of the
+        given dataset rows after fixiating the features of the candidates.
+        Only the codes of the drawn rows are compared with the input, the
+        fixiated features are cleared.
+
+        Args:
+            candidates (list[AnchorCandidate]): AnchorCandidates, each one owns an equal share of the rows.
+            sample_idxs (np.ndarray): Dataset rows of the samples.
+
+        Returns:
+            np.ndarray: Coverage masks, packed if self.packed_masks.
+        """
+        masks = np.take(self.codes, sample_idxs, axis=0) != self.input_codes
+
+        num_samples = len(sample_idxs) // len(candidates)
+        for i, candidate in enumerate(candidates):
+            rows = slice(i * num_samples, (i + 1) * num_samples)
+            masks[rows, candidate.feature_mask] = False
+
+        if self.packed_masks:
+            return np.packbits(masks, axis=1)
+
+        return masks.view(np.uint8)
+
 
 class ImageSampler(Sampler):
     """
@@ -190,18 +774,45 @@ class ImageSampler(Sampler):
         samples and the input.
 
         When dataset equals None samples are generated
-        by utilising mean superpixels.
+        by utilising mean superpixels. Otherwise switched off
+        superpixels are filled with the pixels of random dataset
+        images. The dataset can be a memory-mapped array (or the
+        path of a .npy file which is opened memory-mapped), in this
+        case only the drawn images are read from disk.
 
         Args:
             input (any): Image that is to be explained.
             predict_fn (Callable[[any], np.array]): Black box model predict function.
-            dataset (any): Image dataset from which samples will be collected
+            dataset (any): Image dataset of shape (N, H, W, 3) from which samples will be collected. Must be
+                preprocessed like the input.
+        """
+        self.predict_fn = predict_fn
+
+        if isinstance(dataset, str):
+            dataset = np.load(dataset, mmap_mode="r")
+        self.dataset = dataset
+
+        # number of the explained image, part of the mean superpixel cache keys
+        self.input_epoch = 0
+
+        if input is not None:
+            self.set_input(input)
+
+    def set_input(self, input: any):
         """
+        Sets the image that is explained and segments it. The dataset
+        is kept.
 
+        Args:
+            input (any): Image that is to be explained.
+        """
         assert input.shape[2] == 3
         assert len(input.shape) == 3
 
-        self.label = predict_fn(input[np.newaxis, ...])
+        self.label = self.predict_fn(input[np.newaxis, ...])
+        self.input_epoch += 1
+
+        from skimage.segmentation import quickshift
 
         input = input.clone().cpu().detach().numpy()
         # run segmentation on the image
@@ -210,19 +821,66 @@ class ImageSampler(Sampler):
         )
 
         # parameters from original implementation
-        segment_features = np.unique(self.features)
-        self.num_features = len(segment_features)
+        # relabel segments to 0..num_features-1 so they can be used as index
+        _, segments = np.unique(self.features, return_inverse=True)
+        self.features = segments.reshape(self.features.shape)
+        self.num_features = int(self.features.max()) + 1
+
+        self.__compute_segment_statistics(input)
 
         # create superpixel image by replacing superpixels by its mean in the original image
-        self.sp_image = np.copy(input)
-        for spixel in segment_features:
-            self.sp_image[self.features == spixel, :] = np.mean(
-                self.sp_image[self.features == spixel, :], axis=0
-            )
+        self.sp_image = self.segment_means[self.features].astype(input.dtype)
 
         self.image = input
-        self.predict_fn = predict_fn
-        self.dataset = dataset
+
+        if self.dataset is not None:
+            assert (
+                self.dataset.shape[1:] == self.image.shape
+            ), "dataset images must have the shape of the input."
+
+        # reused output buffer for generated image batches
+        self.__image_buffer = np.empty((0,) + self.image.shape, dtype=self.image.dtype)
+
+    def fork(self, rng: np.random.Generator) -> "ImageSampler":
+        """
+        Shallow copy of the sampler with its own image buffer (see Sampler.fork).
+        """
+        sampler = super().fork(rng)
+        sampler.__image_buffer = np.empty((0,) + self.image.shape, self.image.dtype)
+
+        return sampler
+
+    def __compute_segment_statistics(self, image: np.ndarray):
+        """
+        Computes the mean colour (segment_means), the pixel count
+        (segment_sizes) and the bounding box (segment_bboxes, as
+        [row_min, col_min, row_max, col_max]) of every segment with
+        one pass over the pixels.
+
+        Args:
+            image (np.ndarray): (H, W, 3) image the segments belong to.
+        """
+        segments = self.features.reshape(-1)
+        pixels = image.reshape(-1, image.shape[-1])
+
+        self.segment_sizes = np.bincount(segments, minlength=self.num_features)
+        segment_sums = np.stack(
+            [
+                np.bincount(segments, weights=channel, minlength=self.num_features)
+                for channel in pixels.T
+            ],
+            axis=1,
+        )
+        self.segment_means = segment_sums / self.segment_sizes[:, np.newaxis]
+
+        rows, cols = np.indices(self.features.shape).reshape(2, -1)
+        self.segment_bboxes = np.empty((self.num_features, 4), dtype=int)
+        self.segment_bboxes[:, :2] = np.array(self.features.shape)
+        self.segment_bboxes[:, 2:] = -1
+        np.minimum.at(self.segment_bboxes[:, 0], segments, rows)
+        np.minimum.at(self.segment_bboxes[:, 1], segments, cols)
+        np.maximum.at(self.segment_bboxes[:, 2], segments, rows)
+        np.maximum.at(self.segment_bboxes[:, 3], segments, cols)
 
     def sample(
         self,
@@ -249,10 +907,7 @@ class ImageSampler(Sampler):
             Tuple[AnchorCandidate, np.ndarray]: Structure: [AnchorCandiate, coverage_mask]. In case
             calculate_labels is False return [None, coverage_mask].
         """
-        data = np.random.randint(
-            0, 2, size=(num_samples, self.num_features)
-        )  # generate random feature mask for each sample
-        data[:, candidate.feature_mask] = 1  # set present features to one
+        data = self.__sample_masks(candidate, num_samples)
 
         if not calculate_labels:
             return None, data
@@ -263,6 +918,129 @@ class ImageSampler(Sampler):
         else:
             return self.sample_mean_superpixel(candidate, data, num_samples)
 
+    def perturb(
+        self, candidate: AnchorCandidate, num_samples: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Generates num_samples pertubated images for the candidate without
+        predicting them.
+
+        Args:
+            candidate (AnchorCandidate): AnchorCandiate which contains the features to be fixated.
+            num_samples (int): Number of samples that shall be generated.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Structure: [samples, coverage_mask]
+        """
+        data = self.__sample_masks(candidate, num_samples)
+
+        if self.dataset is not None:
+            return self.__generate_dataset_images(data), data
+        else:
+            return self.__generate_mean_superpixel_images(data), data
+
+    def perturb_batch(
+        self,
+        candidates: list[AnchorCandidate],
+        num_samples: int,
+        rngs: list[np.random.Generator] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Generates num_samples pertubated images for each candidate.
+        The images of all candidates are generated at once into the
+        reused image buffer, so the returned samples are only valid
+        until the next call.
+
+        Args:
+            candidates (list[AnchorCandidate]): AnchorCandidates for which samples are generated.
+            num_samples (int): Number of samples per candidate.
+            rngs (list[np.random.Generator], optional): Random generator per candidate (see Sampler.perturb_batch).
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Structure: [samples, coverage_masks]
+        """
+        samplers = self.forks(rngs, len(candidates))
+        data = np.concatenate(
+            [
+                sampler.__sample_masks(c, num_samples)
+                for sampler, c in zip(samplers, candidates)
+            ],
+            axis=0,
+        )
+
+        out = self.__get_image_buffer(data.shape[0])
+        if self.dataset is not None:
+            # the dataset images are drawn after the masks, as in perturb
+            sample_idxs = np.concatenate(
+                [sampler.__sample_dataset_idxs(num_samples) for sampler in samplers]
+            )
+            return self.__generate_dataset_images(data, out, sample_idxs), data
+        else:
+            return self.__generate_mean_superpixel_images(data, out), data
+
+    def __get_image_buffer(self, num_samples: int) -> np.ndarray:
+        """
+        Returns the reused image buffer for num_samples images and
+        enlarges it if needed.
+
+        Args:
+            num_samples (int): Number of images.
+
+        Returns:
+            np.ndarray: Buffer of shape (num_samples, H, W, 3)
+        """
+        if self.__image_buffer.shape[0] < num_samples:
+            self.__image_buffer = np.empty(
+                (num_samples,) + self.image.shape, dtype=self.image.dtype
+            )
+
+        return self.__image_buffer[:num_samples]
+
+    def cache_keys(self, samples: np.ndarray, masks: np.ndarray) -> list:
+        """
+        With mean superpixels the image is fully defined by its superpixel
+        mask, so the mask is used as cache key instead of the whole image.
+        The mask only identifies the image together with the explained
+        image, so the key also holds the input_epoch. In dataset mode the
+        images are keyed by a 128 bit digest of their bytes, so the cache
+        does not keep a copy of every image.
+
+        Args:
+            samples (np.ndarray): Pertubated images.
+            masks (np.ndarray): Superpixel masks of the images.
+
+        Returns:
+            list: Hashable key per sample.
+        """
+        if self.dataset is not None:
+            return [
+                hashlib.blake2b(sample.tobytes(), digest_size=16).digest()
+                for sample in samples
+            ]
+
+        return [(self.input_epoch, mask.astype(bool).tobytes()) for mask in masks]
+
+    def __sample_masks(
+        self, candidate: AnchorCandidate, num_samples: int
+    ) -> np.ndarray:
+        """
+        Draws a random superpixel mask for each sample and switches
+        on the superpixels of the candidate.
+
+        Args:
+            candidate (AnchorCandidate): AnchorCandiate which contains the features to be fixated.
+            num_samples (int): Number of samples that shall be generated.
+
+        Returns:
+            np.ndarray: Feature masks
+        """
+        data = self.rng.integers(
+            0, 2, size=(num_samples, self.num_features)
+        )  # generate random feature mask for each sample
+        data[:, candidate.feature_mask] = 1  # set present features to one
+
+        return data
+
     def sample_dataset(
         self, candidate: AnchorCandidate, data: np.ndarray, num_samples: int,
     ) -> Tuple[AnchorCandidate, np.ndarray]:
@@ -277,28 +1055,101 @@ class ImageSampler(Sampler):
         Returns:
             Tuple[AnchorCandidate, np.ndarray]: Structure: [AnchorCandiate, coverage_mask]
         """
-        perturb_sample_idxs = np.random.choice(
-            range(self.dataset.shape[0]), num_samples, replace=True
-        )
-
-        # generate samples from the dataset
-        samples = np.stack(
-            [
-                self.__generate_image(mask, self.dataset[pidx])
-                for mask, pidx in zip(data, perturb_sample_idxs)
-            ],
-            axis=0,
+        samples = self.__generate_dataset_images(
+            data, self.__get_image_buffer(data.shape[0])
         )
 
         # predict samples
-        preds = self.predict_fn(samples)
-        labels = (preds == self.label).astype(int)
+        labels = self.compute_labels(samples, data)
 
         # update candidate prec
         candidate.update_precision(np.sum(labels), num_samples)
 
         return candidate, data
 
+    def __sample_dataset_idxs(self, num_samples: int) -> np.ndarray:
+        """
+        Draws the dataset image that fills the switched off superpixels
+        of each sample.
+
+        Args:
+            num_samples (int): Number of samples.
+
+        Returns:
+            np.ndarray: Dataset indices
+        """
+        return self.rng.integers(0, self.dataset.shape[0], size=num_samples)
+
+    def __generate_dataset_images(
+        self,
+        data: np.ndarray,
+        out: np.ndarray = None,
+        sample_idxs: np.ndarray = None,
+    ) -> np.ndarray:
+        """
+        Generates one image per feature mask by utilising the image dataset.
+        Switched off superpixels are filled with a random dataset image. Each
+        drawn dataset image is read only once, even if it is drawn several times.
+
+        Args:
+            data (np.ndarray): Features masks
+            out (np.ndarray, optional): Buffer of shape (num_samples, H, W, 3) the images are written to.
+            sample_idxs (np.ndarray, optional): Dataset image per feature mask. Drawn if not given.
+
+        Returns:
+            np.ndarray: Generated images
+        """
+        if out is None:
+            out = np.empty((data.shape[0],) + self.image.shape, dtype=self.image.dtype)
+
+        perturb_sample_idxs = sample_idxs
+        if perturb_sample_idxs is None:
+            perturb_sample_idxs = self.__sample_dataset_idxs(data.shape[0])
+
+        # read sorted unique rows, which is sequential for memory-mapped datasets
+        unique_idxs, inverse = np.unique(perturb_sample_idxs, return_inverse=True)
+        out[...] = np.asarray(self.dataset[unique_idxs])[inverse]
+
+        # pixels whose superpixel is switched on keep the original value
+        keep = (data != 0)[:, self.features]
+        np.copyto(out, self.image, where=keep[..., np.newaxis])
+
+        return out
+
+    @staticmethod
+    def create_image_memmap(
+        image_paths: list, filename: str, shape: Tuple[int, int]
+    ) -> np.ndarray:
+        """
+        Writes images into a .npy file that can be used as memory-mapped
+        dataset of the ImageSampler. The images are resized to shape and
+        scaled to [0, 1] one by one, so they never have to fit into memory
+        at once.
+
+        Args:
+            image_paths (list): Paths of the images.
+            filename (str): Path of the .npy file.
+            shape (Tuple[int, int]): Height and width of the images.
+
+        Returns:
+            np.ndarray: Memory-mapped dataset of shape (len(image_paths), H, W, 3).
+        """
+        from skimage.color import gray2rgb
+        from skimage.io import imread
+        from skimage.transform import resize
+
+        dataset = np.lib.format.open_memmap(
+            filename, mode="w+", dtype=np.float32, shape=(len(image_paths), *shape, 3)
+        )
+        for i, path in enumerate(image_paths):
+            image = imread(path)
+            if image.ndim == 2:
+                image = gray2rgb(image)
+            dataset[i] = resize(image[..., :3], shape)
+        dataset.flush()
+
+        return np.load(filename, mmap_mode="r")
+
     def sample_mean_superpixel(
         self, candidate: AnchorCandidate, data: np.ndarray, num_samples: int,
     ) -> Tuple[AnchorCandidate, np.ndarray]:
@@ -323,37 +1174,43 @@ class ImageSampler(Sampler):
         # Returns:
         #     candidate (AnchorCandidate)
         # """
-        samples = np.stack([self.__generate_image(mask) for mask in data], axis=0)
+        samples = self.__generate_mean_superpixel_images(
+            data, self.__get_image_buffer(data.shape[0])
+        )
 
         # predict labels
-        preds = self.predict_fn(samples)
-        labels = (preds == self.label).astype(int)
+        labels = self.compute_labels(samples, data)
 
         # update candidate
         candidate.update_precision(np.sum(labels), num_samples)
 
         return candidate, data
 
-    def __generate_image(self, feature_mask: np.ndarray) -> np.array:
+    def __generate_mean_superpixel_images(
+        self, data: np.ndarray, out: np.ndarray = None
+    ) -> np.ndarray:
         """
-        Generate sample image given some feature mask.
-        The true image will get permutated dependent on the feature mask.
-        Pixel which are outmasked by the mask are replaced by the corresponding superpixel pixel.
+        Generates one image per feature mask by utilising the mean superpixels.
+        The segment of every pixel (self.features) is used as index into the
+        feature masks, so the whole batch is generated with one gather and
+        without a loop over the switched off superpixels.
 
         Args:
-            feature_mask (np.ndarray): Feature mask to generate picture with 
+            data (np.ndarray): Features masks
+            out (np.ndarray, optional): Buffer of shape (num_samples, H, W, 3) the images are written to.
 
         Returns:
-            np.array: Generated image.
+            np.ndarray: Generated images
         """
-        img = self.image.copy()
-        zeros = np.where(feature_mask == 0)[0]
-        mask = np.zeros(self.features.shape).astype(bool)
-        for z in zeros:
-            mask[self.features == z] = True
-        img[mask] = self.sp_image[mask]
+        if out is None:
+            out = np.empty((data.shape[0],) + self.image.shape, dtype=self.image.dtype)
 
-        return img
+        # pixels whose superpixel is switched on keep the original value
+        keep = (data != 0)[:, self.features]
+        out[...] = self.sp_image
+        np.copyto(out, self.image, where=keep[..., np.newaxis])
+
+        return out
 
 
 class TextSampler(Sampler):
@@ -367,7 +1224,16 @@ class TextSampler(Sampler):
 
     type: Tasktype = Tasktype.TEXT
 
-    def __init__(self, input: any, predict_fn: Callable[[any], np.array]):
+    def __init__(
+        self,
+        input: any,
+        predict_fn: Callable[[any], np.array],
+        num_threads: int = None,
+        bert_batch_size: int = 256,
+        topk_cache_path: str = None,
+        topk_cache_size: int = 1000000,
+        prob_cache_size: int = 10000,
+    ):
         """
         Initialises TextSampler with the given
         predict_fn, input, dataset and nlp_object
@@ -378,30 +1244,109 @@ class TextSampler(Sampler):
         Args:
             input (list(str)): Sentences as list of tokens.
             predict_fn (Callable[[any], np.array]): Black box model predict function.
+            num_threads (int, optional): Number of CPU threads torch uses for bert (torch.set_num_threads).
+            bert_batch_size (int): Maximal number of sentences per bert forward pass.
+            topk_cache_path (str, optional): Path of a sqlite database in which the bert predictions are
+                cached persistently (see TopKCache). Explanations over the same corpus reuse the predictions.
+            topk_cache_size (int): Maximal number of sentences in the persistent cache.
+            prob_cache_size (int): Maximal number of sentences whose bert predictions are kept in
+                memory (LRU). Every entry holds the top500 ids and probabilities of each masked token.
+        """
+        self.predict_fn = predict_fn
+        self.bert_batch_size = bert_batch_size
+
+        if num_threads is not None:
+            import torch
+
+            torch.set_num_threads(num_threads)
+
+        self.tokenizer, self.bert = load_masked_lm("distilbert-base-cased")
+
+        # caches bert predictions as (token ids, probabilities), shared by the forks
+        assert prob_cache_size > 0, "prob_cache_size must be higher than 0"
+        self.prob_cache = OrderedDict()
+        self.prob_cache_size = prob_cache_size
+        self.prob_cache_lock = threading.Lock()
+        self.topk_cache_path = topk_cache_path
+        self.topk_cache_size = topk_cache_size
+        self.topk_cache = (
+            TopKCache(topk_cache_path, topk_cache_size)
+            if topk_cache_path is not None
+            else None
+        )
+
+        if input is not None:
+            self.set_input(input)
+
+    def __getstate__(self) -> dict:
+        """
+        Bert, its tokenizer and the caches of its predictions are not
+        pickled, they are loaded again by the unpickling process (e.g.
+        a worker of the ProcessExecutor). Forks share them instead.
+        """
+        state = self.__dict__.copy()
+        for name in (
+            "tokenizer",
+            "bert",
+            "prob_cache",
+            "prob_cache_lock",
+            "topk_cache",
+        ):
+            del state[name]
+
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.tokenizer, self.bert = load_masked_lm("distilbert-base-cased")
+        self.prob_cache = OrderedDict()
+        self.prob_cache_lock = threading.Lock()
+        self.topk_cache = (
+            TopKCache(self.topk_cache_path, self.topk_cache_size)
+            if self.topk_cache_path is not None
+            else None
+        )
+
+    def set_input(self, input: any):
         """
-        self.label = predict_fn([" ".join(input)])
+        Sets the sentence that is explained and predicts the probability
+        of every word given its context. Bert and the caches of its
+        predictions are kept.
+
+        Args:
+            input (list(str)): Sentences as list of tokens.
+        """
+        self.label = self.predict_fn([" ".join(input)])
         self.input = input
         self.num_features = len(self.input)
-        self.predict_fn = predict_fn
 
-        self.tokenizer = DistilBertTokenizer.from_pretrained("distilbert-base-cased")
-        self.bert = DistilBertForMaskedLM.from_pretrained("distilbert-base-cased")
+        # token ids of every input word, padded with -1
+        word_ids = [
+            self.tokenizer.encode(word, add_special_tokens=False) for word in self.input
+        ]
+        self.word_ids = np.full(
+            (self.num_features, max(map(len, word_ids), default=1)), -1, dtype=np.int32
+        )
+        for idx, ids in enumerate(word_ids):
+            self.word_ids[idx, : len(ids)] = ids
 
         # contains top500k probability of each word in the input
         self.pr = {}
 
-        # caches bert predictions
-        self.prob_cache = {}
-
         # mask each word separetly and predict topk given its context
-        for i in range(len(self.input)):
-            masked_sentence = self.input.copy()
-            masked_sentence[i] = self.tokenizer.mask_token
+        tokens = np.repeat(self.word_ids[None], self.num_features, axis=0)
+        diagonal = np.arange(self.num_features)
+        tokens[diagonal, diagonal] = -1
+        tokens[diagonal, diagonal, 0] = self.tokenizer.mask_token_id
 
-            sentence = " ".join(masked_sentence)
+        vocab = self.tokenizer.get_vocab()
+        results = self.prob_ids_batch([self.__encode(t) for t in tokens])
+        for word, (ids, probs) in zip(self.input, results):
+            match = np.nonzero(ids[0] == vocab.get(word, -1))[0]
+            self.pr[word] = min(0.5, float(probs[0, match[0]]) if len(match) else 0.01)
 
-            w, p = self.prob(sentence)[0]
-            self.pr[self.input[i]] = min(0.5, dict(zip(w, p)).get(self.input[i], 0.01))
+        # probability per position that the word is kept
+        self.keep_probs = np.array([self.pr[word] for word in self.input])
 
     def prob(self, sentence: str):
         """
@@ -416,14 +1361,72 @@ class TextSampler(Sampler):
         Returns:
             results (list(tuple(str, float)))
         """
-        if sentence in self.prob_cache:
-            return self.prob_cache[sentence]
+        token_ids = self.tokenizer.encode(sentence, add_special_tokens=True)
+        ((ids, probs),) = self.prob_ids_batch([token_ids])
+
+        return [
+            (self.tokenizer.convert_ids_to_tokens(i.tolist()), p)
+            for i, p in zip(ids, probs)
+        ]
+
+    def prob_ids_batch(
+        self, token_ids: list[np.ndarray]
+    ) -> list[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Predicts the top500 token ids and their exp normalized
+        probabilities of every masked token for several tokenized
+        sentences. Sentences that are neither in the prob_cache (LRU
+        of at most self.prob_cache_size sentences) nor in the persistent
+        cache are predicted with padded batches of at most
+        self.bert_batch_size sentences.
+
+        Args:
+            token_ids (list[np.ndarray]): Token ids of the sentences (with special tokens).
+
+        Returns:
+            list[Tuple[np.ndarray, np.ndarray]]: Per sentence the token ids (int32) and
+                probabilities (float32) of shape (num_masks, 500).
+        """
+        keys = [TopKCache.key(ids) for ids in token_ids]
+
+        probs = {}  # key -> (token ids, probabilities)
+        missing = {}  # key -> token ids
+        with self.prob_cache_lock:
+            for key, ids in zip(keys, token_ids):
+                if key in self.prob_cache:
+                    self.prob_cache.move_to_end(key)
+                    probs[key] = self.prob_cache[key]
+                else:
+                    missing[key] = ids
+
+        if len(missing) > 0:
+            found = (
+                self.topk_cache.get_many(list(missing))
+                if self.topk_cache is not None
+                else {}
+            )
+            to_predict = [key for key in missing if key not in found]
+
+            predicted = {}
+            for start in range(0, len(to_predict), self.bert_batch_size):
+                batch = to_predict[start : start + self.bert_batch_size]
+                results = self.__pred_topk_ids([missing[key] for key in batch])
+                for key, (ids, values) in zip(batch, results):
+                    predicted[key] = (ids, exp_normalize(values))
+
+            if self.topk_cache is not None and len(predicted) > 0:
+                self.topk_cache.put_many(predicted)
+
+            probs.update(found)
+            probs.update(predicted)
 
-        result = self.pred_topk_cbow(sentence)
-        normalized_result = [(a, exp_normalize(b)) for a, b in result]
+            with self.prob_cache_lock:
+                self.prob_cache.update(found)
+                self.prob_cache.update(predicted)
+                while len(self.prob_cache) > self.prob_cache_size:
+                    self.prob_cache.popitem(last=False)
 
-        self.prob_cache[sentence] = normalized_result
-        return normalized_result
+        return [probs[key] for key in keys]
 
     def pred_topk_cbow(self, sentence):
         """
@@ -437,26 +1440,59 @@ class TextSampler(Sampler):
         Returns:
             predictions (list(tuple(str, float)))
         """
-        # encode text
-        encoded_text = self.tokenizer.encode(sentence, add_special_tokens=True)
-        input = torch.tensor([encoded_text])
+        token_ids = self.tokenizer.encode(sentence, add_special_tokens=True)
+        ((ids, values),) = self.__pred_topk_ids([token_ids])
+
+        return [
+            (self.tokenizer.convert_ids_to_tokens(i.tolist()), v)
+            for i, v in zip(ids, values)
+        ]
+
+    def __pred_topk_ids(
+        self, token_ids: list[list[int]], k: int = 500
+    ) -> list[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Predicts the top k token ids (and their logits) of every masked
+        token for several tokenized sentences with one padded bert
+        forward pass.
+
+        Args:
+            token_ids (list[list[int]]): Token ids of the sentences (with special tokens).
+            k (int): Number of predictions per masked token.
+
+        Returns:
+            list[Tuple[np.ndarray, np.ndarray]]: Per sentence the token ids (int32) and logits (float32)
+                of shape (num_masks, k).
+        """
+        import torch
+
+        max_len = max(len(ids) for ids in token_ids)
+        input_ids = torch.full(
+            (len(token_ids), max_len), self.tokenizer.pad_token_id, dtype=torch.long
+        )
+        attention_mask = torch.zeros((len(token_ids), max_len), dtype=torch.long)
+        for row, ids in enumerate(token_ids):
+            input_ids[row, : len(ids)] = torch.as_tensor(ids, dtype=torch.long)
+            attention_mask[row, : len(ids)] = 1
 
         with torch.no_grad():
-            output = self.bert(input)[0]
+            output = self.bert(input_ids=input_ids, attention_mask=attention_mask)[0]
 
-        # get idx for mask token
-        mask_token_idx = (
-            np.array(encoded_text) == self.tokenizer.mask_token_id
-        ).nonzero()[0]
+        # get sentence and token idx for each mask token
+        rows, mask_token_idx = (input_ids == self.tokenizer.mask_token_id).nonzero(
+            as_tuple=True
+        )
 
-        # predict top 500 for each masked word
-        preds_per_word = []
-        for i in mask_token_idx:
-            v, top_preds = torch.topk(output[0, i], 500)
-            words = self.tokenizer.convert_ids_to_tokens(top_preds)
-            preds_per_word.append((words, v.numpy()))
+        # predict top k for each masked word
+        values, top_preds = torch.topk(output[rows, mask_token_idx], k)
+        values = values.numpy().astype(np.float32)
+        top_preds = top_preds.numpy().astype(np.int32)
 
-        return preds_per_word
+        rows = rows.numpy()
+        return [
+            (top_preds[rows == row], values[rows == row])
+            for row in range(len(token_ids))
+        ]
 
     def sample(
         self,
@@ -479,63 +1515,116 @@ class TextSampler(Sampler):
             Tuple[AnchorCandidate, np.ndarray, np.ndarray]: Structure: [AnchorCandiate, coverage_mask, None]. In case
             calculate_labels is False return [None, coverage_mask, None].
         """
-        feature_masks = np.zeros((num_samples, len(self.input)))
-        for idx, word in enumerate(self.input):
-            if idx in candidate.feature_mask:
-                continue
-
-            # decide if we should mask the word or not
-            prob = self.pr[word]
-            feature_masks[:, idx] = np.random.choice(
-                [0, 1], num_samples, p=[1 - prob, prob]
-            )
-
-        # unmask words in candidate mask
-        feature_masks[:, candidate.feature_mask] = 1
+        feature_masks = self.__sample_masks(candidate, num_samples)
 
         if not calculate_labels:
             return None, feature_masks
 
         return self.__sample_pertubated_sentences(candidate, feature_masks, num_samples)
 
-    def __generate_sentence(self, feature_mask: np.ndarray) -> str:
+    def perturb(
+        self, candidate: AnchorCandidate, num_samples: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Generate new sentence by masking words according to the
-        feature mask. For each masked word new words are samples.
-        This is done word for word in an iterative manner to generate
-        more coherent sentences.
+        Generates num_samples pertubated sentences for the candidate without
+        predicting them.
 
         Args:
-            feature_mask (np.ndarray): Features mask where != 1 denotes
-                                        that a word shall be masked
+            candidate (AnchorCandidate): AnchorCandiate which contains the features to be fixated.
+            num_samples (int): Number of samples that shall be generated.
 
         Returns:
-            str: Generated sentence
+            Tuple[np.ndarray, np.ndarray]: Structure: [sentences, coverage_mask]
         """
-        # Generate new sentences by masking words according to the
-        # feature mask. Then new words are samples. This is done
-        # done word for word
+        feature_masks = self.__sample_masks(candidate, num_samples)
 
-        # mask words given the feature mask
-        sentence_cp = np.array(self.input, dtype="|U80")
-        sentence_cp[feature_mask != 1] = self.tokenizer.mask_token
+        return self.__generate_sentences(feature_masks), feature_masks
 
-        # sample new word for each word
-        masked_word = np.where(feature_mask == 0)[0]
-        for word_idx in masked_word:
-            mod_sentence = " ".join(sentence_cp)
-            words, probs = self.prob(mod_sentence)[0]
-            sentence_cp[word_idx] = np.random.choice(words, p=probs)
+    def perturb_batch(
+        self,
+        candidates: list[AnchorCandidate],
+        num_samples: int,
+        rngs: list[np.random.Generator] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Generates num_samples pertubated sentences for each candidate.
+        The sentences of all candidates advance together, so every step
+        needs only one batched bert prediction.
 
-        feature_mask = sentence_cp == np.array(self.input, dtype="|U80")
+        Args:
+            candidates (list[AnchorCandidate]): AnchorCandidates for which samples are generated.
+            num_samples (int): Number of samples per candidate.
+            rngs (list[np.random.Generator], optional): Random generator per candidate (see Sampler.perturb_batch).
 
-        return " ".join(sentence_cp)
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Structure: [sentences, coverage_masks]
+        """
+        samplers = self.forks(rngs, len(candidates))
+        feature_masks = np.concatenate(
+            [
+                sampler.__sample_masks(c, num_samples)
+                for sampler, c in zip(samplers, candidates)
+            ],
+            axis=0,
+        )
+
+        return self.__generate_sentences(feature_masks, samplers), feature_masks
+
+    def predict_samples(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Passes the sentences as list of strings to the predict_fn.
+
+        Args:
+            samples (np.ndarray): Pertubated sentences.
+
+        Returns:
+            np.ndarray: Predictions of the black box model.
+        """
+        return self.predict_fn(samples.flatten().tolist())
+
+    def cache_keys(self, samples: np.ndarray, masks: np.ndarray) -> list:
+        """
+        The sentences itself are used as cache keys.
+
+        Args:
+            samples (np.ndarray): Pertubated sentences.
+            masks (np.ndarray): Feature masks of the sentences.
+
+        Returns:
+            list: Hashable key per sample.
+        """
+        return [str(sentence) for sentence in samples]
+
+    def __sample_masks(
+        self, candidate: AnchorCandidate, num_samples: int
+    ) -> np.ndarray:
+        """
+        Decides for each word that is not within the candidates
+        feature mask if it should be masked given its original
+        probability (self.pr). All words of all samples are drawn
+        at once against the per-position keep probabilities.
+
+        Args:
+            candidate (AnchorCandidate): AnchorCandiate which contains the features to be fixated.
+            num_samples (int): Number of samples that shall be generated.
+
+        Returns:
+            np.ndarray: Feature masks (uint8)
+        """
+        feature_masks = (
+            self.rng.random((num_samples, self.num_features)) < self.keep_probs
+        ).view(np.uint8)
+
+        # unmask words in candidate mask
+        feature_masks[:, candidate.feature_mask] = 1
+
+        return feature_masks
 
     def __sample_pertubated_sentences(
         self, candidate: AnchorCandidate, data: np.ndarray, num_samples: int,
     ) -> Tuple[AnchorCandidate, np.ndarray, np.ndarray]:
         """
-        Generate num_sampels new sentences (via self.__generate_sentence),
+        Generate num_sampels new sentences (via self.__generate_sentences),
         predicts the labels and updates the precision for the AnchorCandidate
         candidate.
 
@@ -548,14 +1637,112 @@ class TextSampler(Sampler):
         Returns:
             Tuple[AnchorCandidate, np.ndarray, np.ndarray]: Structure [AnchorCandidate, feature_masks, None]
         """
-        sentences = np.apply_along_axis(self.__generate_sentence, 1, data).reshape(
-            -1, 1
-        )
+        sentences = self.__generate_sentences(data)
 
         # predict pertubed sentences
-        preds = self.predict_fn(sentences.flatten().tolist())
-        labels = (preds == self.label).astype(int)
+        labels = self.compute_labels(sentences, data)
 
         # update candidate
         candidate.update_precision(np.sum(labels), num_samples)
         return candidate, data
+
+    def __encode(self, tokens: np.ndarray) -> np.ndarray:
+        """
+        Builds the bert input of a sentence from its word token ids.
+
+        Args:
+            tokens (np.ndarray): Token ids per word, padded with -1.
+
+        Returns:
+            np.ndarray: Token ids with special tokens.
+        """
+        return np.concatenate(
+            (
+                [self.tokenizer.cls_token_id],
+                tokens[tokens >= 0],
+                [self.tokenizer.sep_token_id],
+            )
+        ).astype(np.int32)
+
+    def __sample_ids(
+        self, ids: np.ndarray, probs: np.ndarray, uniform: np.ndarray
+    ) -> np.ndarray:
+        """
+        Draws one token id per row via inverse cdf sampling.
+
+        Args:
+            ids (np.ndarray): Token ids of shape (num_rows, k).
+            probs (np.ndarray): Probabilities of the token ids of shape (num_rows, k).
+            uniform (np.ndarray): Uniform random number in [0, 1) per row.
+
+        Returns:
+            np.ndarray: Drawn token id per row.
+        """
+        cdf = np.cumsum(probs, axis=1, dtype=np.float64)
+        cdf /= cdf[:, -1:]
+        idxs = (cdf <= uniform[:, None]).sum(axis=1)
+
+        return ids[np.arange(len(ids)), np.minimum(idxs, ids.shape[1] - 1)]
+
+    def __generate_sentences(
+        self, data: np.ndarray, samplers: list["TextSampler"] = None
+    ) -> np.ndarray:
+        """
+        Generate new sentences by masking words according to the
+        feature masks. For each masked word new words are samples.
+        This is done word for word in an iterative manner to generate
+        more coherent sentences, but all sentences advance together so
+        that every step needs only one batched bert prediction.
+
+        The sentences are kept as token ids and are only decoded
+        to strings once all masked words are replaced.
+
+        Args:
+            data (np.ndarray): Several feature_masks, != 1 denotes
+                                that a word shall be masked
+            samplers (list[TextSampler], optional): Samplers whose generators draw the words of
+                equally sized blocks of sentences (see perturb_batch). Defaults to self.
+
+        Returns:
+            np.ndarray: Generated sentences
+        """
+        if samplers is None:
+            samplers = [self]
+        block_size = data.shape[0] // len(samplers)
+
+        # mask words given the feature masks
+        replaced = data != 1
+        masked = replaced.copy()
+        tokens = np.repeat(self.word_ids[None], data.shape[0], axis=0)
+        tokens[masked] = -1
+        tokens[..., 0][masked] = self.tokenizer.mask_token_id
+
+        # sample the first masked word of every sentence per step
+        while masked.any():
+            rows = np.nonzero(masked.any(axis=1))[0]
+            word_idxs = masked[rows].argmax(axis=1)
+
+            results = self.prob_ids_batch([self.__encode(t) for t in tokens[rows]])
+            ids = np.stack([ids[0] for ids, _ in results])
+            probs = np.stack([probs[0] for _, probs in results])
+
+            # every block draws from its sampler as if it was generated alone
+            uniform = np.empty(len(rows))
+            blocks = rows // block_size
+            for block, sampler in enumerate(samplers):
+                in_block = blocks == block
+                uniform[in_block] = sampler.rng.random(np.count_nonzero(in_block))
+
+            tokens[rows, word_idxs, 0] = self.__sample_ids(ids, probs, uniform)
+
+            masked[rows, word_idxs] = False
+
+        # decode the sampled tokens
+        sampled_ids, inverse = np.unique(tokens[..., 0][replaced], return_inverse=True)
+        sampled_words = np.array(
+            self.tokenizer.convert_ids_to_tokens(sampled_ids.tolist()), dtype=object
+        )
+        sentences = np.tile(np.array(self.input, dtype=object), (data.shape[0], 1))
+        sentences[replaced] = sampled_words[inverse]
+
+        return np.array([" ".join(s) for s in sentences])
@@ -0,0 +1,257 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Union
+
+import numpy as np
+
+
+class ArrowDataset:
+    """
+    Read-only row access to a tabular Arrow table, Arrow IPC (feather)
+    file or Parquet file that is too large to be loaded into memory.
+
+    Only the requested rows are read: Arrow IPC files are memory mapped,
+    Parquet files are read per row group. Rows are returned as numpy
+    arrays with one column per table column, like a numpy dataset.
+
+    Parquet can only be decompressed per row group (up to 1M rows by
+    default), so the decoded row groups are kept in a bounded LRU cache.
+    Random draws over a file with more row groups than the cache holds
+    decompress a whole row group per drawn group. For random access to
+    large datasets convert the file to Arrow IPC (pyarrow.feather with
+    compression="uncompressed") or .npy first.
+    """
+
+    def __init__(self, source: any, max_cached_row_groups: int = 4):
+        """
+        Args:
+            source (any): Path of an Arrow IPC / Parquet file or a pyarrow.Table.
+            max_cached_row_groups (int): Maximal number of decoded Parquet row groups that are kept
+                in memory (each needs rows per group * num_columns * itemsize bytes).
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        assert max_cached_row_groups > 0, "max_cached_row_groups must be higher than 0"
+
+        self.max_cached_row_groups = max_cached_row_groups
+        self.__parquet = None
+        self.__table = None
+        self.__row_groups = OrderedDict()  # row group -> decoded rows
+        self.__lock = threading.Lock()
+
+        if isinstance(source, (str, os.PathLike)) and str(source).endswith(".parquet"):
+            self.__parquet = pq.ParquetFile(source)
+            schema = self.__parquet.schema_arrow
+            metadata = self.__parquet.metadata
+            group_rows = [
+                metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)
+            ]
+            # first row of every row group
+            self.__group_starts = np.concatenate(([0], np.cumsum(group_rows)))
+            num_rows = metadata.num_rows
+        elif isinstance(source, (str, os.PathLike)):
+            self.__table = pa.ipc.open_file(pa.memory_map(str(source), "r")).read_all()
+            schema = self.__table.schema
+            num_rows = self.__table.num_rows
+        else:
+            self.__table = source
+            schema = self.__table.schema
+            num_rows = self.__table.num_rows
+
+        self.column_names = schema.names
+        self.shape = (num_rows, len(schema.names))
+        self.dtype = np.result_type(
+            *[np.dtype(field.type.to_pandas_dtype()) for field in schema]
+        )
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, idxs: Union[slice, np.ndarray]) -> np.ndarray:
+        """
+        Reads the given rows.
+
+        Args:
+            idxs (Union[slice, np.ndarray]): Row slice or row indices.
+
+        Returns:
+            np.ndarray: Rows of shape (len(idxs), num_columns)
+        """
+        if isinstance(idxs, slice):
+            idxs = np.arange(*idxs.indices(self.shape[0]))
+        idxs = np.asarray(idxs, dtype=np.int64).reshape(-1)
+
+        if self.__parquet is None:
+            return self.__to_numpy(self.__table.take(idxs))
+
+        out = np.empty((len(idxs), self.shape[1]), dtype=self.dtype)
+        row_groups = np.searchsorted(self.__group_starts, idxs, side="right") - 1
+        for row_group in np.unique(row_groups):
+            rows = row_groups == row_group
+            out[rows] = self.__read_row_group(row_group)[
+                idxs[rows] - self.__group_starts[row_group]
+            ]
+
+        return out
+
+    def __read_row_group(self, row_group: int) -> np.ndarray:
+        """
+        Returns the decoded rows of a parquet row group from the cache or
+        reads them and evicts the least recently used row group.
+
+        Args:
+            row_group (int): Index of the row group.
+
+        Returns:
+            np.ndarray: Rows of the row group
+        """
+        with self.__lock:
+            if row_group in self.__row_groups:
+                self.__row_groups.move_to_end(row_group)
+                return self.__row_groups[row_group]
+
+        rows = self.__to_numpy(self.__parquet.read_row_group(int(row_group)))
+
+        with self.__lock:
+            self.__row_groups[row_group] = rows
+            while len(self.__row_groups) > self.max_cached_row_groups:
+                self.__row_groups.popitem(last=False)
+
+        return rows
+
+    def __to_numpy(self, table: any) -> np.ndarray:
+        """
+        Converts a pyarrow.Table into rows of shape (num_rows, num_columns).
+        """
+        out = np.empty((table.num_rows, self.shape[1]), dtype=self.dtype)
+        for i, column in enumerate(table.columns):
+            out[:, i] = column.to_numpy()
+
+        return out
+
+
+def open_dataset(source: any) -> Union[np.ndarray, ArrowDataset]:
+    """
+    Opens a tabular dataset without loading it into memory.
+
+    Args:
+        source (any): Path of a .npy file (memory mapped), of an Arrow IPC /
+            Parquet file or a pyarrow.Table.
+
+    Returns:
+        Union[np.ndarray, ArrowDataset]: Dataset with row access via indexing.
+    """
+    if isinstance(source, (str, os.PathLike)) and str(source).endswith(".npy"):
+        return np.load(source, mmap_mode="r")
+
+    return ArrowDataset(source)
+
+
+class ValueIndex:
+    """
+    Per column index of a discretized tabular dataset that maps every
+    value to the sorted ids of the rows holding it.
+
+    The index of a column is built on first use, so only columns that
+    are part of an anchor are ever scanned.
+    """
+
+    def __init__(
+        self, dataset: any, chunk_size: int = 65536, transform: Callable = None
+    ):
+        """
+        Args:
+            dataset (any): Tabular dataset (numpy array, np.memmap or ArrowDataset).
+            chunk_size (int): Number of rows read at once from out of memory datasets.
+            transform (Callable, optional): Applied to every chunk of rows before indexing
+                (e.g. QuantileDiscretizer.transform).
+        """
+        self.dataset = dataset
+        self.chunk_size = chunk_size
+        self.transform = transform
+
+        # column -> (sorted values, first position of every value, row ids ordered by value)
+        self.__columns = {}
+
+    def rows(self, column: int, value: any) -> np.ndarray:
+        """
+        Returns the rows in which the column holds the value.
+
+        Args:
+            column (int): Column index.
+            value (any): Value of the column.
+
+        Returns:
+            np.ndarray: Sorted row ids
+        """
+        if column not in self.__columns:
+            self.__columns[column] = self.__build_column(column)
+
+        values, starts, order = self.__columns[column]
+        pos = np.searchsorted(values, value)
+        if pos == len(values) or values[pos] != value:
+            return order[:0]
+
+        return order[starts[pos] : starts[pos + 1]]
+
+    def matching_rows(
+        self, columns: list, values: list, rows: np.ndarray = None
+    ) -> np.ndarray:
+        """
+        Returns the rows that hold all values in the given columns by
+        intersecting the sorted row ids of every column.
+
+        Args:
+            columns (list): Column indices.
+            values (list): Value per column.
+            rows (np.ndarray, optional): Sorted row ids the result is restricted to.
+
+        Returns:
+            np.ndarray: Sorted row ids
+        """
+        row_lists = [self.rows(c, v) for c, v in zip(columns, values)]
+        if rows is not None:
+            row_lists.append(rows)
+        if len(row_lists) == 0:
+            return np.arange(self.dataset.shape[0])
+
+        # intersect starting with the shortest list
+        row_lists.sort(key=len)
+        result = row_lists[0]
+        for other in row_lists[1:]:
+            if len(result) == 0:
+                break
+            pos = np.minimum(np.searchsorted(other, result), len(other) - 1)
+            result = result[other[pos] == result]
+
+        return result
+
+    def __build_column(self, column: int):
+        """
+        Reads one column and sorts its row ids by value.
+
+        Args:
+            column (int): Column index.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: Sorted values, first position of every
+                value (plus the end) and the row ids ordered by value.
+        """
+        if type(self.dataset) is np.ndarray and self.transform is None:
+            data = self.dataset[:, column]
+        else:
+            transform = self.transform or (lambda rows: rows)
+            data = np.concatenate(
+                [
+                    transform(self.dataset[start : start + self.chunk_size])[:, column]
+                    for start in range(0, self.dataset.shape[0], self.chunk_size)
+                ]
+            )
+
+        # stable sort keeps the row ids of every value sorted
+        order = np.argsort(data, kind="stable")
+        values, starts = np.unique(data[order], return_index=True)
+
+        return values, np.append(starts, len(data)), order
@@ -1,6 +1,7 @@
 import numpy as np
-import tensorflow as tf
-import torch
+
+# tensorflow and torch are imported by the wrappers, so importing
+# this module does not load them
 
 
 def tf_wrapper(func):
@@ -8,6 +9,8 @@ def tf_wrapper(func):
     Should not be used in current state, since not tested
     """
     def wrapper(*args, **kwargs):
+        import tensorflow as tf
+
         x = tf.convert_to_tensor(args[0])
         y_proba = func(x).numpy()
         func(*args, **kwargs)
@@ -17,7 +20,7 @@ def tf_wrapper(func):
     return wrapper
 
 
-def pytorch_wrapper(device=torch.device("cpu")):
+def pytorch_wrapper(device=None):
     """
     Decorator that converts anchor image samples
     (np.ndarray) to a Tensor and extracts the labels
@@ -31,6 +34,10 @@ def pytorch_wrapper(device=torch.device("cpu")):
                                     Defaults to torch.device("cpu").
     """
 
+    import torch
+
+    device = torch.device("cpu") if device is None else device
+
     def _decorate(func):
         def wrapper(*args, **kwargs):
             x = torch.Tensor(args[0])
@@ -43,7 +50,7 @@ def pytorch_wrapper(device=torch.device("cpu")):
     return _decorate
 
 
-def pytorch_image_wrapper(device=torch.device("cpu")):
+def pytorch_image_wrapper(device=None):
     """
     Decorator that converts anchor image samples
     (np.ndarray) to a Tensor and extracts the labels
@@ -58,6 +65,10 @@ def pytorch_image_wrapper(device=torch.device("cpu")):
                                     Defaults to torch.device("cpu").
     """
 
+    import torch
+
+    device = torch.device("cpu") if device is None else device
+
     def _decorate(func):
         def wrapper(x):
             x = torch.Tensor(x)
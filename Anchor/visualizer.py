@@ -1,10 +1,9 @@
 from typing import Callable
 
-import matplotlib.pyplot as plt
 import numpy as np
-from skimage.segmentation import mark_boundaries
 
 from .candidate import AnchorCandidate
+from .discretizer import QuantileDiscretizer
 from .sampler import Tasktype
 
 
@@ -64,9 +63,13 @@ class ImageVisualizer(Visualizer):
             (np.ndarray): (M, N, 3) array of floats. 
             An image in which the boundaries between labels are superimposed on the original image.
         """
-        idxs = np.argwhere(~np.isin(features, anchor.feature_mask))
-        mask = features.copy()
-        mask[idxs[:, 0], idxs[:, 1]] = 0
+        from skimage.segmentation import mark_boundaries
+
+        # look up per segment if it belongs to the anchor instead of
+        # comparing every pixel with the feature mask
+        in_anchor = np.zeros(features.max() + 1, dtype=bool)
+        in_anchor[np.asarray(anchor.feature_mask, dtype=int)] = True
+        mask = np.where(in_anchor[features], features, 0)
         exp_visu = mark_boundaries(
             original_instance, mask, mode="thick", outline_color=(0, 0, 0)
         )
@@ -110,6 +113,14 @@ class TabularVisualizer(Visualizer):
 
     type: Tasktype = Tasktype.TABULAR
 
+    def __init__(self, discretizer: QuantileDiscretizer = None):
+        """
+        Args:
+            discretizer (QuantileDiscretizer, optional): Discretizer of the dataset. If given
+                the anchor shows the bin ranges instead of the values of the instance.
+        """
+        self.discretizer = discretizer
+
     def visualize(
         self, anchor: AnchorCandidate, original_instance: np.array, features: np.array
     ):
@@ -124,6 +135,13 @@ class TabularVisualizer(Visualizer):
         Returns:
             (str): Returns the orignial sentence with the importants words marked in yellow. 
         """
+        if self.discretizer is not None:
+            codes = self.discretizer.transform(np.ravel(original_instance))
+            return " AND ".join(
+                self.discretizer.describe(i, codes[i])
+                for i in range(len(codes))
+                if i in anchor.feature_mask
+            )
 
         exp_visu = [
             f"{k} = {v}"
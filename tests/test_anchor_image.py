@@ -15,13 +15,17 @@ from skimage.util import img_as_float
 from torchvision.models import resnet18
 
 """
-Test funtions for the image sampler and anchor explainations on images
+Test funtions for the image sampler and anchor explainations on images.
+Needs the pretrained resnet18 weights (downloaded on the first run).
 """
 
 
 @pytest.fixture(scope="session", autouse=True)
 def setup():
-    model = resnet18(pretrained=True)
+    try:
+        model = resnet18(pretrained=True)
+    except OSError as error:  # includes failed downloads (URLError)
+        pytest.skip("pretrained resnet18 weights not available: {}".format(error))
     model.eval()
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     model.to(device)
@@ -3,6 +3,8 @@ import pytest
 import sklearn
 import sklearn.ensemble
 from Anchor.anchor import Anchor
+from Anchor.candidate import AnchorCandidate
+from Anchor.executor import SamplingExecutor
 from Anchor.sampler import Tasktype
 
 """
@@ -56,8 +58,9 @@ def test_tabular_greedy_search():
         batch_size=32,
     )
 
-    assert anchor.feature_mask == [2, 0]
-    assert np.isclose(anchor.coverage, 0.54)
+    assert anchor.feature_mask == [2, 0, 1]
+    assert np.isclose(anchor.coverage, 0.48)
+    assert explainer.kl_lucb is explainer.bandit
 
 
 def test_tabular_beam_search():
@@ -74,8 +77,144 @@ def test_tabular_beam_search():
         batch_size=32,
     )
 
-    assert anchor.feature_mask == [0, 2]
-    assert np.isclose(anchor.coverage, 0.54)
+    assert anchor.feature_mask == [2, 1, 0]
+    assert np.isclose(anchor.coverage, 0.48)
+    # [2, 0] has the same coverage but negative samples (precision about 0.99),
+    # so it does not reach the desired confidence of 1.0
+    assert explainer.candidate_registry[frozenset([2, 0])].precision < 1.0
+
+
+def test_tabular_executor_same_anchor():
+    anchors = []
+    for executor in [None, "thread"]:
+        explainer = Anchor(Tasktype.TABULAR)
+        anchors.append(
+            explainer.explain_instance(
+                input=pytest.train_data[759].reshape(1, -1),
+                predict_fn=pytest.predict_fn,
+                method="greedy",
+                task_specific=pytest.task_paras,
+                method_specific={"desired_confidence": 0.95},
+                num_coverage_samples=100,
+                batch_size=32,
+                executor=executor,
+            )
+        )
+
+    assert anchors[0].feature_mask == anchors[1].feature_mask
+    assert anchors[0].n_samples == anchors[1].n_samples
+    assert anchors[0].positive_samples == anchors[1].positive_samples
+
+
+def test_tabular_named_executor_is_shut_down(monkeypatch):
+    created = []
+    create = SamplingExecutor.create
+
+    def record_create(type, **kwargs):
+        created.append(create(type, **kwargs))
+        return created[-1]
+
+    monkeypatch.setattr(SamplingExecutor, "create", record_create)
+
+    # the sampler cannot be created, the executor is shut down anyway
+    explainer = Anchor(Tasktype.TABULAR)
+    with pytest.raises(AssertionError):
+        explainer.explain_instance(
+            input=pytest.train_data[759].reshape(1, -1),
+            predict_fn=pytest.predict_fn,
+            task_specific={"dataset": pytest.train_data, "column_names": ["a"]},
+            executor="thread",
+        )
+
+    # a fitted explainer owns its executor until it is closed
+    with Anchor(Tasktype.TABULAR).fit(
+        pytest.predict_fn,
+        pytest.task_paras,
+        num_coverage_samples=100,
+        executor="thread",
+    ) as fitted:
+        fitted.explain(pytest.train_data[759].reshape(1, -1), batch_size=32)
+        assert fitted.executor is created[1]
+
+    assert explainer.executor is None and fitted.executor is None
+    for executor in created:
+        with pytest.raises(RuntimeError):
+            executor.submit(fitted.sampler, AnchorCandidate([0]), 1, fitted.rng)
+
+
+def test_tabular_candidate_registry():
+    explainer = Anchor(Tasktype.TABULAR)
+    explainer.explain_instance(
+        input=pytest.train_data[759].reshape(1, -1),
+        predict_fn=pytest.predict_fn,
+        task_specific=pytest.task_paras,
+        method_specific={"desired_confidence": 1.0},
+        num_coverage_samples=100,
+        batch_size=32,
+    )
+
+    candidates = explainer.generate_candidates(
+        [AnchorCandidate([0]), AnchorCandidate([2])], 0
+    )
+    feature_sets = [frozenset(c.feature_mask) for c in candidates]
+    assert len(feature_sets) == len(set(feature_sets))
+
+    # [2, 0] keeps its samples when it is generated again as [0, 2]
+    candidate = candidates[feature_sets.index(frozenset([0, 2]))]
+    candidate.update_precision(3, 4)
+    candidates = explainer.generate_candidates([AnchorCandidate([0])], 0)
+    assert any(c is candidate for c in candidates)
+
+
+def test_tabular_unsupported_bandit_argument():
+    explainer = Anchor(Tasktype.TABULAR)
+
+    with pytest.raises(ValueError, match="prefetch"):
+        explainer.explain_instance(
+            input=pytest.train_data[759].reshape(1, -1),
+            predict_fn=pytest.predict_fn,
+            task_specific=pytest.task_paras,
+            bandit_specific={"prefetch": 2},
+            num_coverage_samples=100,
+            bandit="elimination",
+        )
+
+
+def test_tabular_explain_many():
+    explainer = Anchor(Tasktype.TABULAR)
+    method_paras = {"desired_confidence": 1.0}
+    anchors = explainer.explain_many(
+        pytest.train_data[[759, 759]],
+        predict_fn=pytest.predict_fn,
+        backend="process",
+        n_jobs=2,
+        method="greedy",
+        task_specific=pytest.task_paras,
+        method_specific=method_paras,
+        num_coverage_samples=100,
+        batch_size=32,
+    )
+
+    assert len(anchors) == 2
+    assert all(a.precision == 1.0 for a in anchors)
+
+
+def test_tabular_fit_explain():
+    explainer = Anchor(Tasktype.TABULAR).fit(
+        pytest.predict_fn, pytest.task_paras, num_coverage_samples=100
+    )
+    sampler = explainer.sampler
+
+    for row in [759, 10]:
+        anchor = explainer.explain(
+            pytest.train_data[row].reshape(1, -1),
+            method_specific={"desired_confidence": 1.0},
+            batch_size=32,
+        )
+
+        assert explainer.sampler is sampler
+        assert anchor.precision == 1.0
+        assert len(anchor.feature_mask) > 0
 
 
 """
@@ -6,11 +6,12 @@ import sklearn
 import sklearn.ensemble
 import spacy
 from Anchor.anchor import Anchor
-from Anchor.sampler import Tasktype
+from Anchor.sampler import Tasktype, load_masked_lm
 from sklearn.feature_extraction.text import CountVectorizer
 
 """
-Test funtions for text data anchor explainations
+Test funtions for text data anchor explainations. Need the spacy model
+en_core_web_sm and the pretrained distilbert (downloaded on the first run).
 """
 
 
@@ -37,7 +38,13 @@ def setup():
     """
     For text tests we use cornell polarity data and a simple sample sentence
     """
-    nlp = spacy.load("en_core_web_sm")
+    try:
+        nlp = spacy.load("en_core_web_sm")
+        load_masked_lm("distilbert-base-cased")
+    except OSError as error:
+        pytest.skip(
+            "spacy model or pretrained distilbert not available: {}".format(error)
+        )
     text_to_be_explained = "This is a good book ."
     preprocessed_text = [word.text for word in nlp(text_to_be_explained)]
     data, labels = load_polarity()
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+from Anchor.batching import MicroBatchPredictor
+
+"""
+Test funtions for the micro batching predict adapter
+"""
+
+
+def test_concurrent_calls_are_coalesced():
+    calls = []
+
+    def predict_fn(x):
+        calls.append(len(x))
+        return x[:, 0] * 2
+
+    results = {}
+    with MicroBatchPredictor(predict_fn, max_batch_size=64, max_delay=0.2) as predictor:
+
+        def worker(i):
+            results[i] = predictor(np.full((8, 3), i))
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    assert all(np.array_equal(results[i], np.full(8, 2 * i)) for i in range(8))
+    assert sum(calls) == 64 and len(calls) < 8
+    assert max(calls) <= 64
+
+
+def test_text_samples_and_asyncio():
+    def predict_fn(x):
+        return np.array([len(s) for s in x])
+
+    async def explain(predictor):
+        return await asyncio.gather(
+            predictor.predict_async(["a", "bb"]), predictor.predict_async(["ccc"])
+        )
+
+    with MicroBatchPredictor(predict_fn, max_delay=0.05) as predictor:
+        first, second = asyncio.run(explain(predictor))
+
+    assert list(first) == [1, 2] and list(second) == [3]
+
+
+def test_exceptions_are_returned_to_the_callers():
+    def predict_fn(x):
+        raise RuntimeError("model failed")
+
+    with MicroBatchPredictor(predict_fn, max_delay=0) as predictor:
+        with pytest.raises(RuntimeError):
+            predictor(np.zeros((2, 2)))
@@ -0,0 +1,59 @@
+import numpy as np
+from Anchor.cache import PredictionCache, TopKCache
+
+"""
+Test funtions for the prediction caches
+"""
+
+
+def test_cache_hits_and_misses():
+    calls = []
+
+    def predict_fn(x):
+        calls.append(len(x))
+        return x.sum(axis=1)
+
+    cache = PredictionCache(maxsize=10)
+    samples = np.array([[1, 2], [3, 4], [1, 2]])
+    keys = [s.tobytes() for s in samples]
+
+    assert list(cache.predict(predict_fn, samples, keys)) == [3, 7, 3]
+    assert calls == [2]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    assert list(cache.predict(predict_fn, samples, keys)) == [3, 7, 3]
+    assert calls == [2]
+    assert (cache.hits, cache.misses) == (4, 2)
+
+
+def test_cache_eviction():
+    cache = PredictionCache(maxsize=2)
+    samples = np.arange(6).reshape(3, 2)
+    keys = [s.tobytes() for s in samples]
+    cache.predict(lambda x: x[:, 0], samples, keys)
+
+    assert len(cache) == 2
+
+    # first sample was evicted
+    cache.predict(lambda x: x[:, 0], samples[:1], keys[:1])
+    assert cache.misses == 4
+
+
+def test_topk_cache_persistent(tmp_path):
+    path = str(tmp_path / "topk.db")
+    ids = np.arange(6, dtype=np.int32).reshape(2, 3)
+    probs = np.full((2, 3), 1 / 3, dtype=np.float32)
+    keys = [TopKCache.key([101, 103, 102]), TopKCache.key([101, 7, 103, 102])]
+
+    cache = TopKCache(path, maxsize=1)
+    cache.put_many({keys[0]: (ids, probs)})
+    cache.put_many({keys[1]: (ids[:1], probs[:1])})
+
+    # the least recently used sentence was evicted
+    assert len(cache) == 1
+
+    # predictions survive between cache instances
+    found = TopKCache(path).get_many(keys)
+    assert list(found) == [keys[1]]
+    assert np.array_equal(found[keys[1]][0], ids[:1])
+    assert np.allclose(found[keys[1]][1], probs[:1])
@@ -0,0 +1,39 @@
+import numpy as np
+from Anchor.coverage import CoverageIndex
+
+"""
+Test funtions for the bitset coverage index
+"""
+
+
+def naive_coverage(coverage_data, feature_mask):
+    return np.mean(np.all(coverage_data[:, feature_mask] == 1, axis=1))
+
+
+def test_coverage_matches_naive():
+    coverage_data = np.random.default_rng(0).integers(0, 2, size=(1003, 12))
+    index = CoverageIndex(coverage_data)
+
+    for feature_mask in [[0], [3, 5], [1, 2, 11], list(range(12))]:
+        assert np.isclose(
+            index.coverage(feature_mask), naive_coverage(coverage_data, feature_mask)
+        )
+
+
+def test_coverage_empty_mask():
+    coverage_data = np.zeros((17, 4), dtype=int)
+    index = CoverageIndex(coverage_data)
+
+    assert index.coverage([]) == 1.0
+    assert index.coverage([2]) == 0.0
+
+
+def test_extend_parent_bits():
+    coverage_data = np.random.default_rng(2).integers(0, 2, size=(301, 5))
+    index = CoverageIndex(coverage_data)
+
+    parents = np.stack([index.covered([0]), index.covered([1, 2])])
+    children = index.extend(parents, [3, 4])
+
+    assert np.array_equal(children[0], index.covered([0, 3]))
+    assert np.array_equal(children[1], index.covered([1, 2, 4]))
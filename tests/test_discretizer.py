@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from Anchor.candidate import AnchorCandidate
+from Anchor.discretizer import QuantileDiscretizer
+from Anchor.sampler import Sampler, Tasktype
+from Anchor.visualizer import Visualizer
+
+"""
+Test funtions for the quantile discretizer
+"""
+
+
+@pytest.fixture()
+def dataset():
+    rng = np.random.default_rng(0)
+    return np.column_stack(
+        [rng.normal(size=1000), rng.integers(0, 3, size=1000).astype(float)]
+    )
+
+
+def test_quantile_bins(dataset):
+    discretizer = QuantileDiscretizer(dataset, ["x", "c"], categorical_features=[1])
+    codes = discretizer.transform(dataset)
+
+    assert codes.dtype == np.uint8
+    assert np.array_equal(np.bincount(codes[:, 0]), [250, 250, 250, 250])
+    assert np.array_equal(codes[:, 1], dataset[:, 1])
+    assert discretizer.transform(np.array([0.0, 7.0]))[1] == 255
+    assert discretizer.codes is discretizer.codes
+
+
+def test_describe(dataset):
+    discretizer = QuantileDiscretizer(dataset, ["x", "c"], categorical_features=[1])
+    q1, q2, q3 = discretizer.edges[0]
+
+    assert discretizer.describe(0, 0) == f"x <= {q1:.2f}"
+    assert discretizer.describe(0, 2) == f"{q2:.2f} < x <= {q3:.2f}"
+    assert discretizer.describe(0, 3) == f"x > {q3:.2f}"
+    assert discretizer.describe(1, 2) == "c = 2.0"
+
+    visualizer = Visualizer.create(Tasktype.TABULAR, discretizer=discretizer)
+    anchor = AnchorCandidate([0, 1])
+    assert visualizer.visualize(anchor, dataset[0], ["x", "c"]) == " AND ".join(
+        discretizer.describe(i, code)
+        for i, code in enumerate(discretizer.transform(dataset[0]))
+    )
+
+
+def test_sampler_coverage_on_bins(dataset):
+    discretizer = QuantileDiscretizer(dataset, ["x", "c"], categorical_features=[1])
+    sampler = Sampler.create(
+        Tasktype.TABULAR,
+        dataset[:1],
+        lambda x: (x[:, 0] > 0).astype(int),
+        {"dataset": dataset, "column_names": ["x", "c"], "discretizer": discretizer},
+        rng=np.random.default_rng(0),
+    )
+    samples, masks = sampler.perturb(AnchorCandidate([1]), 50)
+
+    assert np.array_equal(
+        masks, discretizer.transform(samples) != discretizer.transform(dataset[:1])
+    )
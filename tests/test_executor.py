@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from Anchor.candidate import AnchorCandidate
+from Anchor.executor import SamplingExecutor
+from Anchor.sampler import Sampler, Tasktype
+
+"""
+Test funtions for the sampling executors
+"""
+
+
+def sample_batch(executor: SamplingExecutor):
+    # large enough to be passed to the process workers via shared memory
+    dataset = np.random.default_rng(0).integers(0, 3, size=(5000, 4))
+    sampler = Sampler.create(
+        Tasktype.TABULAR,
+        dataset[:1],
+        lambda x: x[:, 0],
+        {"dataset": dataset, "column_names": ["a", "b", "c", "d"]},
+        rng=np.random.default_rng(1),
+        executor=executor,
+    )
+    if executor is not None:
+        executor.bind(sampler)
+
+    candidates = [AnchorCandidate([0]), AnchorCandidate([1, 2]), AnchorCandidate([])]
+    candidates, masks = sampler.sample_batch(candidates, 16)
+
+    return [c.positive_samples for c in candidates], np.stack(masks)
+
+
+def test_executors_give_the_same_samples():
+    results = [sample_batch(None)]
+    for type in ["serial", "thread", "process"]:
+        with SamplingExecutor.create(type, n_jobs=2) as executor:
+            results.append(sample_batch(executor))
+
+    positives, masks = results[0]
+    assert positives[0] == 16
+    assert masks.shape == (3, 16, 4)
+    for other_positives, other_masks in results[1:]:
+        assert other_positives == positives
+        assert np.array_equal(other_masks, masks)
+
+
+def test_unknown_executor():
+    with pytest.raises(ValueError):
+        SamplingExecutor.create("gpu")
@@ -0,0 +1,33 @@
+import subprocess
+import sys
+
+"""
+Test that importing the library does not load the task specific backends
+"""
+
+BACKENDS = [
+    "torch",
+    "tensorflow",
+    "transformers",
+    "spacy",
+    "matplotlib",
+    "smac",
+    "ConfigSpace",
+    "skimage",
+]
+
+
+def test_import_is_lazy():
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import Anchor.anchor, Anchor.util, Anchor.visualizer\n"
+        "print(time.perf_counter() - start)\n"
+        f"print([m for m in {BACKENDS!r} if m in sys.modules])\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout.splitlines()
+
+    assert out[1] == "[]"
+    assert float(out[0]) < 5
@@ -1,4 +1,8 @@
-from Anchor.bandit import KL_LUCB
+import numpy as np
+import pytest
+from Anchor.bandit import KL_LUCB, SuccessiveElimination
+from Anchor.candidate import AnchorCandidate
+from Anchor.sampler import Sampler, Tasktype
 
 
 def test_dup_bernoulli():
@@ -19,3 +23,112 @@ def test_kl_bernoulli():
 def test_compute_beta_bernoulli():
     beta = KL_LUCB.compute_beta(5, 1, 0.5)
     assert beta == 10.424889480332546
+
+
+def test_bernoulli_batch_matches_scalar():
+    precisions = np.array([0.0, 0.2, 0.5, 0.9, 1.0])
+    levels = np.array([1, 0.5, 1, 0.1, 2])
+
+    ub = KL_LUCB.dup_bernoulli_batch(precisions, levels)
+    lb = KL_LUCB.dlow_bernoulli_batch(precisions, levels)
+
+    assert list(ub) == [KL_LUCB.dup_bernoulli(p, l) for p, l in zip(precisions, levels)]
+    assert list(lb) == [
+        KL_LUCB.dlow_bernoulli(p, l) for p, l in zip(precisions, levels)
+    ]
+
+
+def test_bernoulli_batch_newton():
+    precisions = np.array([0.0, 0.2, 0.5, 0.9, 1.0])
+    levels = np.array([1, 0.5, 1, 0.1, 2])
+
+    ub = KL_LUCB.dup_bernoulli_batch(precisions, levels, "newton", 1e-12)
+    lb = KL_LUCB.dlow_bernoulli_batch(precisions, levels, "newton", 1e-12)
+
+    assert np.allclose(ub, KL_LUCB.dup_bernoulli_batch(precisions, levels), atol=1e-6)
+    assert np.allclose(lb, KL_LUCB.dlow_bernoulli_batch(precisions, levels), atol=1e-6)
+
+
+def test_prefetch():
+    dataset = np.random.default_rng(0).integers(0, 3, size=(500, 4))
+
+    def best_candidate(prefetch):
+        sampler = Sampler.create(
+            Tasktype.TABULAR,
+            dataset[:1],
+            lambda x: x[:, 0],
+            {"dataset": dataset, "column_names": ["a", "b", "c", "d"]},
+            rng=np.random.default_rng(1),
+        )
+        candidates = [AnchorCandidate([f]) for f in range(4)]
+        kl_lucb = KL_LUCB(batch_size=10, prefetch=prefetch)
+        best = kl_lucb.get_best_candidates(candidates, sampler)[0]
+        return best, candidates, kl_lucb.prefetch_stats
+
+    best, candidates, stats = best_candidate(4)
+    other_best, other_candidates, _ = best_candidate(4)
+
+    assert best.feature_mask == [0]
+    assert [c.n_samples for c in candidates] == [c.n_samples for c in other_candidates]
+    # every speculative batch is either used or discarded
+    assert stats.produced == stats.used + stats.discarded
+    assert sum(c.n_samples for c in candidates) == 10 * (stats.used + stats.missed)
+
+
+def test_prefetch_closed_on_error():
+    dataset = np.random.default_rng(0).integers(0, 3, size=(500, 4))
+    calls = []
+
+    def predict_fn(x):
+        calls.append(len(x))
+        if len(calls) > 3:
+            raise RuntimeError("predict_fn failed")
+        return x[:, 0]
+
+    sampler = Sampler.create(
+        Tasktype.TABULAR,
+        dataset[:1],
+        predict_fn,
+        {"dataset": dataset, "column_names": ["a", "b", "c", "d"]},
+        rng=np.random.default_rng(1),
+    )
+    candidates = [AnchorCandidate([f]) for f in range(4)]
+    kl_lucb = KL_LUCB(batch_size=10, prefetch=4)
+
+    with pytest.raises(RuntimeError):
+        kl_lucb.get_best_candidates(candidates, sampler)
+
+    # the queued batches were discarded by close
+    stats = kl_lucb.prefetch_stats
+    assert stats.produced > 0
+    assert stats.produced == stats.used + stats.discarded
+
+
+def test_successive_elimination():
+    dataset = np.random.default_rng(0).integers(0, 3, size=(500, 40))
+
+    def best_candidates(bandit):
+        calls = []
+
+        def predict_fn(x):
+            calls.append(len(x))
+            return x[:, 0]
+
+        sampler = Sampler.create(
+            Tasktype.TABULAR,
+            dataset[:1],
+            predict_fn,
+            {"dataset": dataset, "column_names": [str(f) for f in range(40)]},
+            rng=np.random.default_rng(1),
+        )
+        candidates = [AnchorCandidate([f]) for f in range(40)]
+        best = bandit.get_best_candidates(candidates, sampler, 2)
+        return best, calls
+
+    best, calls = best_candidates(SuccessiveElimination(batch_size=10))
+    _, kl_lucb_calls = best_candidates(KL_LUCB(batch_size=10))
+
+    assert len(best) == 2 and best[-1].feature_mask == [0]
+    # the first call predicts the input, the first round pulls all arms
+    assert calls[1] == 40 * 10
+    assert len(calls) < len(kl_lucb_calls)
@@ -0,0 +1,131 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+from Anchor.cache import PredictionCache
+from Anchor.candidate import AnchorCandidate
+from Anchor.sampler import ImageSampler, Sampler, Tasktype
+from skimage.data import astronaut
+from skimage.transform import resize
+
+"""
+Test funtions for the image sampler on a small image without a model
+"""
+
+
+@pytest.fixture(scope="module")
+def sampler():
+    image = torch.tensor(resize(astronaut(), (64, 64)).astype(np.float32))
+
+    def predict_fn(x):
+        return (np.asarray(x).mean(axis=(1, 2, 3)) > 0.4).astype(int)
+
+    return Sampler.create(
+        Tasktype.IMAGE, image, predict_fn, {}, rng=np.random.default_rng(0)
+    )
+
+
+def test_perturb_mean_superpixel(sampler):
+    samples, masks = sampler.perturb(AnchorCandidate([0]), 20)
+
+    assert samples.shape == (20,) + sampler.image.shape
+    for sample, mask in zip(samples, masks):
+        on = (mask != 0)[sampler.features]
+        assert np.array_equal(sample[on], sampler.image[on])
+        assert np.array_equal(sample[~on], sampler.sp_image[~on])
+
+
+def test_sample_batch(sampler):
+    candidates = [AnchorCandidate([0]), AnchorCandidate([1, 2])]
+    candidates, masks = sampler.sample_batch(candidates, 8)
+
+    assert [c.n_samples for c in candidates] == [8, 8]
+    assert np.all(masks[1][:, [1, 2]] == 1)
+
+
+def test_sample_dataset(sampler, tmp_path):
+    image_dir = Path("datasets/tiny_imagenet_train_sub/images")
+    paths = sorted(image_dir.glob("*.JPEG"))[:10]
+    dataset = ImageSampler.create_image_memmap(
+        paths, str(tmp_path / "images.npy"), sampler.image.shape[:2]
+    )
+
+    dataset_sampler = Sampler.create(
+        Tasktype.IMAGE,
+        torch.tensor(sampler.image),
+        sampler.predict_fn,
+        {"dataset": str(tmp_path / "images.npy")},
+        rng=np.random.default_rng(0),
+    )
+    candidate, masks = dataset_sampler.sample(AnchorCandidate([0]), 12)
+    samples, masks = dataset_sampler.perturb(AnchorCandidate([0]), 12)
+
+    assert candidate.n_samples == 12
+    assert isinstance(dataset_sampler.dataset, np.memmap)
+    for sample, mask in zip(samples, masks):
+        on = (mask != 0)[dataset_sampler.features]
+        assert np.array_equal(sample[on], dataset_sampler.image[on])
+        # switched off superpixels come from one of the dataset images
+        assert any(np.array_equal(sample[~on], image[~on]) for image in dataset)
+
+    # images are cached by a digest instead of their bytes
+    keys = dataset_sampler.cache_keys(samples, masks)
+    assert all(isinstance(key, bytes) and len(key) == 16 for key in keys)
+    unique_images = {sample.tobytes() for sample in samples}
+    assert len(set(keys)) == len(unique_images)
+
+    # a batch with a generator per candidate gives the samples of the forks
+    candidates = [AnchorCandidate([0]), AnchorCandidate([1])]
+    rngs = [np.random.default_rng(seed) for seed in range(2)]
+    samples, masks = dataset_sampler.perturb_batch(candidates, 6, rngs)
+    for i, candidate in enumerate(candidates):
+        fork = dataset_sampler.fork(np.random.default_rng(i))
+        fork_samples, fork_masks = fork.perturb(candidate, 6)
+        assert np.array_equal(samples[i * 6 : (i + 1) * 6], fork_samples)
+        assert np.array_equal(masks[i * 6 : (i + 1) * 6], fork_masks)
+
+
+def test_segment_statistics(sampler):
+    for segment in [0, sampler.num_features - 1]:
+        pixels = sampler.features == segment
+        rows, cols = np.nonzero(pixels)
+
+        assert sampler.segment_sizes[segment] == pixels.sum()
+        assert np.allclose(
+            sampler.segment_means[segment], sampler.image[pixels].mean(axis=0)
+        )
+        assert list(sampler.segment_bboxes[segment]) == [
+            rows.min(),
+            cols.min(),
+            rows.max(),
+            cols.max(),
+        ]
+
+
+def test_cache_is_per_image():
+    def predict_fn(x):
+        return (np.asarray(x).mean(axis=(1, 2, 3)) > 0.4).astype(int)
+
+    # same four segments in both images, but only the first one is bright
+    bright = torch.zeros((32, 32, 3))
+    bright[:16, :16] = 0.9
+    bright[:16, 16:] = torch.tensor([0.9, 0.5, 0.5])
+    bright[16:, :16] = torch.tensor([0.5, 0.9, 0.5])
+    bright[16:, 16:] = torch.tensor([0.5, 0.5, 0.9])
+    dark = bright * 0.3
+
+    sampler = Sampler.create(
+        Tasktype.IMAGE,
+        None,
+        predict_fn,
+        {},
+        cache=PredictionCache(1000),
+        rng=np.random.default_rng(0),
+    )
+    for image in [bright, dark]:
+        sampler.set_input(image)
+        samples, masks = sampler.perturb(AnchorCandidate([]), 50)
+        labels = sampler.compute_labels(samples, masks)
+
+        assert np.array_equal(labels, predict_fn(samples) == sampler.label)
@@ -0,0 +1,178 @@
+import numpy as np
+import pytest
+from Anchor.cache import PredictionCache
+from Anchor.candidate import AnchorCandidate
+from Anchor.sampler import Sampler, Tasktype
+from Anchor.sources import ArrowDataset, ValueIndex
+
+"""
+Test funtions for the tabular sampler
+"""
+
+
+@pytest.fixture()
+def sampler():
+    """
+    Small discretized dataset where the label is the value of the first column.
+    """
+    dataset = np.random.default_rng(0).integers(0, 3, size=(200, 4))
+    calls = []
+
+    def predict_fn(x):
+        calls.append(len(x))
+        return x[:, 0]
+
+    sampler = Sampler.create(
+        Tasktype.TABULAR,
+        dataset[:1],
+        predict_fn,
+        {"dataset": dataset, "column_names": ["a", "b", "c", "d"]},
+    )
+    sampler.calls = calls
+    return sampler
+
+
+def test_sample_batch_single_predict_call(sampler):
+    sampler.calls.clear()
+    candidates = [AnchorCandidate([0]), AnchorCandidate([1])]
+    candidates, masks = sampler.sample_batch(candidates, 10)
+
+    assert sampler.calls == [20]
+    assert [c.n_samples for c in candidates] == [10, 10]
+    assert candidates[0].precision == 1
+    assert len(masks) == 2 and masks[0].shape == (10, 4)
+
+
+def test_sample_batch_same_candidate_twice(sampler):
+    candidate = AnchorCandidate([0])
+    sampler.sample_batch([candidate, candidate], 8)
+
+    assert candidate.n_samples == 16
+    assert candidate.precision == 1
+
+
+def test_prediction_cache(sampler):
+    sampler.cache = PredictionCache()
+    sampler.calls.clear()
+    candidate = AnchorCandidate([0, 1, 2, 3])
+    sampler.sample(candidate, 50)
+
+    # all samples equal the input
+    assert sampler.calls == [1]
+    assert sampler.cache.hits == 49
+    assert candidate.precision == 1
+
+
+def test_coverage_masks_match_samples(sampler):
+    candidate = AnchorCandidate([1, 3])
+    samples, masks = sampler.perturb(candidate, 30)
+
+    assert masks.dtype == np.uint8
+    assert np.array_equal(masks, samples != sampler.input)
+    assert np.all(masks[:, [1, 3]] == 0)
+
+
+def test_packed_masks(sampler):
+    sampler.packed_masks = True
+    sampler.rng = np.random.default_rng(1)
+    samples, masks = sampler.perturb(AnchorCandidate([2]), 30)
+
+    assert masks.shape == (30, 1)
+    assert np.array_equal(
+        np.unpackbits(masks, axis=1, count=4), samples != sampler.input
+    )
+
+
+def test_memmap_dataset(sampler, tmp_path):
+    np.save(tmp_path / "dataset.npy", sampler.dataset)
+    memmap_sampler = Sampler.create(
+        Tasktype.TABULAR,
+        sampler.input,
+        sampler.predict_fn,
+        {"dataset": str(tmp_path / "dataset.npy"), "column_names": sampler.features},
+        rng=np.random.default_rng(3),
+    )
+    sampler.rng = np.random.default_rng(3)
+
+    assert isinstance(memmap_sampler.dataset, np.memmap)
+    for expected, result in zip(
+        sampler.perturb_batch([AnchorCandidate([0]), AnchorCandidate([2, 3])], 20),
+        memmap_sampler.perturb_batch(
+            [AnchorCandidate([0]), AnchorCandidate([2, 3])], 20
+        ),
+    ):
+        assert np.array_equal(expected, result)
+
+
+def test_parquet_dataset(sampler, tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    table = pa.table({name: column for name, column in zip("abcd", sampler.dataset.T)})
+    pq.write_table(table, tmp_path / "dataset.parquet", row_group_size=32)
+
+    dataset = ArrowDataset(str(tmp_path / "dataset.parquet"))
+    idxs = np.array([150, 3, 77, 31, 32])
+
+    assert dataset.shape == sampler.dataset.shape
+    assert dataset.column_names == ["a", "b", "c", "d"]
+    assert np.array_equal(dataset[idxs], sampler.dataset[idxs])
+
+
+def test_value_index_matching_rows(sampler):
+    index = ValueIndex(sampler.dataset)
+    rows = index.matching_rows([0, 2], [1, 2])
+
+    expected = np.flatnonzero(
+        (sampler.dataset[:, 0] == 1) & (sampler.dataset[:, 2] == 2)
+    )
+    assert np.array_equal(rows, expected)
+    assert len(index.rows(1, 7)) == 0
+
+
+def test_conditional_sampling(sampler):
+    conditional_sampler = Sampler.create(
+        Tasktype.TABULAR,
+        sampler.input,
+        sampler.predict_fn,
+        {
+            "dataset": sampler.dataset,
+            "column_names": sampler.features,
+            "conditional": True,
+        },
+        rng=np.random.default_rng(0),
+    )
+    candidate = AnchorCandidate([0, 3])
+    samples, masks = conditional_sampler.perturb(candidate, 20)
+
+    # all samples are real dataset rows that hold the anchored input values
+    matching = conditional_sampler.value_index.matching_rows(
+        [0, 3], sampler.input[0, [0, 3]]
+    )
+    assert all(
+        (sample == sampler.dataset[matching]).all(axis=1).any() for sample in samples
+    )
+    assert np.array_equal(masks, samples != sampler.input)
+
+
+def test_conditional_sampling_min_support(sampler):
+    # the input is the only row with the value 3 in the first column
+    dataset = sampler.dataset.copy()
+    dataset[0, 0] = 3
+    conditional_sampler = Sampler.create(
+        Tasktype.TABULAR,
+        dataset[:1],
+        sampler.predict_fn,
+        {"dataset": dataset, "column_names": sampler.features, "conditional": True},
+        rng=np.random.default_rng(0),
+    )
+    samples, masks = conditional_sampler.perturb(AnchorCandidate([0]), 20)
+
+    # overwrites the feature in random rows instead of copying the input row
+    assert (samples[:, 0] == 3).all()
+    assert not (samples == dataset[0]).all(axis=1).all()
+    assert masks[:, 1:].any()
+
+    # a lower min support samples the single matching row
+    conditional_sampler.min_support = 1
+    samples, _ = conditional_sampler.perturb(AnchorCandidate([0]), 20)
+    assert (samples == dataset[0]).all()
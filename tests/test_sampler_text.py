@@ -0,0 +1,152 @@
+import numpy as np
+import pytest
+import torch
+from Anchor import sampler as sampler_module
+from Anchor.candidate import AnchorCandidate
+from Anchor.sampler import Sampler, Tasktype
+
+"""
+Test funtions for the text sampler with a stub tokenizer and masked language model
+"""
+
+
+class StubTokenizer:
+    """
+    Word level tokenizer with the interface the TextSampler uses.
+    """
+
+    def __init__(self, words: list):
+        self.vocab = {
+            word: idx
+            for idx, word in enumerate(["[PAD]", "[CLS]", "[SEP]", "[MASK]"] + words)
+        }
+        self.words = list(self.vocab)
+        self.pad_token_id, self.cls_token_id, self.sep_token_id = 0, 1, 2
+        self.mask_token_id = 3
+
+    def encode(self, text: str, add_special_tokens: bool = True) -> list:
+        return [self.vocab[word] for word in text.split()]
+
+    def get_vocab(self) -> dict:
+        return self.vocab
+
+    def convert_ids_to_tokens(self, ids: list) -> list:
+        return [self.words[idx] for idx in ids]
+
+
+class StubMaskedLM:
+    """
+    Predicts the same logits for every position and records the batch
+    size of every forward pass.
+    """
+
+    def __init__(self, vocab_size: int):
+        self.logits = torch.linspace(0, 5, vocab_size)
+        self.batch_sizes = []
+
+    def __call__(self, input_ids, attention_mask):
+        self.batch_sizes.append(len(input_ids))
+        return (self.logits.expand(input_ids.shape + self.logits.shape).clone(),)
+
+
+@pytest.fixture()
+def sampler(monkeypatch):
+    words = "This is a good book .".split() + ["w{}".format(i) for i in range(600)]
+    tokenizer = StubTokenizer(words)
+    bert = StubMaskedLM(len(tokenizer.vocab))
+    monkeypatch.setattr(
+        sampler_module, "load_masked_lm", lambda name=None: (tokenizer, bert)
+    )
+
+    def predict_fn(sentences):
+        return np.array([int("good" in sentence.split()) for sentence in sentences])
+
+    return Sampler.create(
+        Tasktype.TEXT,
+        "This is a good book .".split(),
+        predict_fn,
+        {"bert_batch_size": 4},
+        rng=np.random.default_rng(0),
+    )
+
+
+def test_fork_shares_caches(sampler):
+    fork = sampler.fork(np.random.default_rng(1))
+
+    assert fork.rng is not sampler.rng
+    for name in ("tokenizer", "bert", "prob_cache", "prob_cache_lock", "topk_cache"):
+        assert getattr(fork, name) is getattr(sampler, name)
+
+    # predictions of the fork are cached for the sampler
+    sampler.bert.batch_sizes.clear()
+    fork.perturb(AnchorCandidate([3]), 10)
+    sampler.perturb(AnchorCandidate([3]), 10)
+    calls = len(sampler.bert.batch_sizes)
+    sampler.fork(np.random.default_rng(1)).perturb(AnchorCandidate([3]), 10)
+    assert len(sampler.bert.batch_sizes) == calls
+
+
+def test_perturb_batch_same_as_forks(sampler):
+    candidates = [AnchorCandidate([3]), AnchorCandidate([0, 4])]
+    rngs = [np.random.default_rng(seed) for seed in range(2)]
+    samples, masks = sampler.perturb_batch(candidates, 8, rngs)
+
+    for i, candidate in enumerate(candidates):
+        fork = sampler.fork(np.random.default_rng(i))
+        fork_samples, fork_masks = fork.perturb(candidate, 8)
+        assert np.array_equal(samples[i * 8 : (i + 1) * 8], fork_samples)
+        assert np.array_equal(masks[i * 8 : (i + 1) * 8], fork_masks)
+
+
+def test_sample_masks(sampler):
+    candidate = AnchorCandidate([1, 3])
+    _, masks = sampler.sample(candidate, 20000, calculate_labels=False)
+
+    assert masks.shape == (20000, sampler.num_features)
+    assert masks.dtype == np.uint8
+    assert np.all(masks[:, [1, 3]] == 1)
+    # the other words are kept with their keep probability
+    free = [0, 2, 4, 5]
+    assert np.allclose(masks[:, free].mean(axis=0), sampler.keep_probs[free], atol=0.02)
+
+
+def test_bert_batch_size(sampler):
+    sampler.bert.batch_sizes.clear()
+    sentences, masks = sampler.perturb(AnchorCandidate([]), 10)
+
+    assert len(sentences) == 10
+    # the masked sentences of a step are predicted in batches of bert_batch_size
+    assert max(sampler.bert.batch_sizes) == sampler.bert_batch_size
+    # at least one pass per step, a step replaces one masked word per sentence
+    assert len(sampler.bert.batch_sizes) >= (masks == 0).sum(axis=1).max()
+
+
+def test_sample_ids_distribution(sampler):
+    probs = np.array([[0.1, 0.6, 0.3]] * 50000, dtype=np.float32)
+    ids = np.tile(np.array([7, 8, 9], dtype=np.int32), (50000, 1))
+    uniform = np.random.default_rng(0).random(50000)
+
+    drawn = sampler._TextSampler__sample_ids(ids, probs, uniform)
+
+    frequencies = np.array([(drawn == i).mean() for i in [7, 8, 9]])
+    assert np.allclose(frequencies, probs[0], atol=0.01)
+
+
+def test_determinism(sampler):
+    results = [
+        sampler.fork(np.random.default_rng(3)).perturb(AnchorCandidate([0]), 15)
+        for _ in range(2)
+    ]
+
+    assert np.array_equal(results[0][0], results[1][0])
+    assert np.array_equal(results[0][1], results[1][1])
+
+
+def test_generated_sentences_keep_words(sampler):
+    sentences, masks = sampler.perturb(AnchorCandidate([3]), 50)
+
+    for sentence, mask in zip(sentences, masks):
+        words = np.array(sentence.split())
+        assert len(words) == sampler.num_features
+        assert np.array_equal(words[mask == 1], np.array(sampler.input)[mask == 1])
+        assert all(word in sampler.tokenizer.vocab for word in words[mask == 0])